@@ -0,0 +1,294 @@
+"""
+Aggregation of the ingredients quantities of a shopping list by (name, unit)
+"""
+import copy
+import importlib.util
+
+from units import to_int_if_integer
+
+# NumPy is imported by the first aggregation that uses it, it is the slowest import of the application
+numpy = None
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+
+def _load_numpy():
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+
+def to_number(quantity):
+    """Convert a quantity saved as text (by the console) to a number"""
+    if isinstance(quantity, str):
+        quantity = float(quantity)
+        if quantity.is_integer():
+            quantity = int(quantity)
+    return quantity
+
+
+class Aggregator:
+    """Sum the ingredients of recipes references by (name, unit)
+
+    Each recipe is encoded once : its (name, unit) pairs become integer codes. The sums are then computed
+    with numpy.bincount when NumPy is installed, else with a pure Python loop on the codes.
+    """
+
+    def __init__(self, use_numpy: bool = None, units=None):
+        """units : UnitRegistry used to normalize the ingredients, None to keep them as they are"""
+        self.units = units
+        self.use_numpy = NUMPY_AVAILABLE if use_numpy is None else use_numpy
+        if self.use_numpy and not NUMPY_AVAILABLE:
+            raise ImportError("use_numpy needs the numpy package (pip install numpy)")
+        # code -> (name, unit)
+        self.keys = []
+        self._codes = {}
+        # Codes with a float quantity, the others are displayed as integers
+        self._float_codes = set()
+        self.clear()
+
+    def clear(self, version=None):
+        """Forget the encoded recipes, the codes are kept
+
+        version : version of the recipes that will be encoded, lets the users of a shared aggregator know if it is
+        up to date
+        """
+        self.version = version
+        # Codes and quantities of all the encoded recipes, one after the other
+        self._flat_codes = []
+        self._flat_quantities = []
+        self._flat_arrays = None
+        # recipe id -> (start, length) in the flat lists
+        self._encoded = {}
+
+    def missing(self, ids):
+        """Return the ids of the recipes that are not encoded yet"""
+        return {id for id in ids if id not in self._encoded}
+
+    def encode(self, recipe_id, batch):
+        """Encode the IngredientBatch of a recipe"""
+        start = len(self._flat_codes)
+        for name, quantity, unit in zip(batch.names, batch.quantities, batch.units):
+            quantity = to_number(quantity)
+            if self.units is not None:
+                name, quantity, unit = self.units.normalize(name, quantity, unit)
+            key = (name, unit)
+            code = self._codes.get(key)
+            if code is None:
+                code = len(self.keys)
+                self._codes[key] = code
+                self.keys.append(key)
+            if isinstance(quantity, float):
+                self._float_codes.add(code)
+            self._flat_codes.append(code)
+            self._flat_quantities.append(quantity)
+        self._encoded[recipe_id] = (start, len(self._flat_codes) - start)
+        self._flat_arrays = None
+
+    def snapshot(self):
+        """Return a copy of the encoded recipes that can only aggregate, sent once to the worker processes"""
+        snapshot = copy.copy(self)
+        # The units and the code lookup are only needed to encode
+        snapshot.units = None
+        snapshot._codes = None
+        snapshot._flat_arrays = None
+        return snapshot
+
+    def aggregate(self, recipes_refs):
+        """Return {(name, unit): total quantity} for the references, in order of first appearance
+
+        The recipes of the references must be encoded, references to unknown recipes are ignored
+        """
+        totals, _ = self.aggregate_with_counts(recipes_refs)
+        return totals
+
+    def aggregate_with_counts(self, recipes_refs):
+        """Like aggregate, also return {(name, unit): number of references using it}"""
+        if self.use_numpy:
+            return self._aggregate_numpy(recipes_refs)
+        return self._aggregate_python(recipes_refs)
+
+    def _aggregate_python(self, recipes_refs):
+        totals = {}
+        counts = {}
+        codes = self._flat_codes
+        quantities = self._flat_quantities
+        for recipe_ref in recipes_refs:
+            encoded = self._encoded.get(recipe_ref["recipe_id"])
+            if encoded is None:
+                continue
+            factor = recipe_ref["quantity"]
+            start, length = encoded
+            for i in range(start, start + length):
+                code = codes[i]
+                if code in totals:
+                    totals[code] += quantities[i] * factor
+                    counts[code] += 1
+                else:
+                    totals[code] = quantities[i] * factor
+                    counts[code] = 1
+        return ({self.keys[code]: total for code, total in totals.items()},
+                {self.keys[code]: count for code, count in counts.items()})
+
+    def _aggregate_numpy(self, recipes_refs):
+        starts = []
+        lengths = []
+        factors = []
+        for recipe_ref in recipes_refs:
+            encoded = self._encoded.get(recipe_ref["recipe_id"])
+            if encoded is None:
+                continue
+            starts.append(encoded[0])
+            lengths.append(encoded[1])
+            factors.append(recipe_ref["quantity"])
+        if not starts:
+            return {}, {}
+
+        _load_numpy()
+        if self._flat_arrays is None:
+            self._flat_arrays = (numpy.array(self._flat_codes, dtype=numpy.intp),
+                                 numpy.array(self._flat_quantities, dtype=numpy.float64))
+        flat_codes, flat_quantities = self._flat_arrays
+
+        # Positions in the flat arrays of the ingredients of all the references
+        starts = numpy.array(starts, dtype=numpy.intp)
+        lengths = numpy.array(lengths, dtype=numpy.intp)
+        offsets = numpy.cumsum(lengths) - lengths
+        positions = numpy.arange(lengths.sum()) + numpy.repeat(starts - offsets, lengths)
+
+        codes = flat_codes[positions]
+        weights = flat_quantities[positions] * numpy.repeat(numpy.array(factors, dtype=numpy.float64), lengths)
+        totals = numpy.bincount(codes, weights=weights, minlength=len(self.keys))
+        counts = numpy.bincount(codes, minlength=len(self.keys))
+
+        # Keep the order of first appearance, like the pure Python loop
+        used_codes, first_positions = numpy.unique(codes, return_index=True)
+        used_codes = used_codes[numpy.argsort(first_positions, kind="stable")]
+        result = {}
+        result_counts = {}
+        # tolist converts the whole arrays to Python numbers at once instead of one item() by code
+        for code, total, count in zip(used_codes.tolist(), totals[used_codes].tolist(), counts[used_codes].tolist()):
+            if code not in self._float_codes and total.is_integer():
+                total = int(total)
+            result[self.keys[code]] = total
+            result_counts[self.keys[code]] = count
+        return result, result_counts
+
+
+def subtract_stock(totals: dict, stock: dict):
+    """Return {(name, unit): quantity to buy} of totals minus the stock, both by (name, unit)
+
+    Ingredients fully in stock are dropped, a stock in another unit than the totals is not subtracted
+    """
+    net = {}
+    for key, total in totals.items():
+        in_stock = stock.get(key)
+        if in_stock is None:
+            net[key] = total
+            continue
+        # Rounded to hide float errors of the subtraction, like the units conversions
+        remaining = to_int_if_integer(round(total - in_stock, 9))
+        if remaining > 0:
+            net[key] = remaining
+    return net
+
+
+# Minimum number of references by worker process of aggregate_many, below the start of the processes and the
+# pickling of the snapshot cost more than the aggregation they share
+POOL_MIN_REFS = 50_000
+
+
+def _aggregate_chunk(snapshot: Aggregator, refs_lists):
+    """Aggregate lists of references in a worker process of aggregate_many"""
+    return [snapshot.aggregate_with_counts(recipes_refs) for recipes_refs in refs_lists]
+
+
+def aggregate_many(aggregator: Aggregator, refs_lists, workers: int = 1, min_refs_by_worker: int = POOL_MIN_REFS):
+    """Return the aggregate_with_counts of several lists of references, in order
+
+    workers : maximum number of processes, the lists are aggregated in this process with 1 (the default), and in a
+    pool only if there are at least min_refs_by_worker references by worker. Each worker receives a snapshot of the
+    aggregator with its share of the lists. The pool forks the process, avoid it in a multithreaded process.
+    The recipes of the references must be encoded.
+    """
+    refs_lists = [[{"recipe_id": recipe_ref["recipe_id"], "quantity": recipe_ref["quantity"]}
+                   for recipe_ref in recipes_refs]
+                  for recipes_refs in refs_lists]
+    refs_count = sum(len(recipes_refs) for recipes_refs in refs_lists)
+    workers = min(workers, len(refs_lists), refs_count // max(1, min_refs_by_worker))
+    if workers < 2:
+        return [aggregator.aggregate_with_counts(recipes_refs) for recipes_refs in refs_lists]
+    # Imported only when a pool is needed, like numpy
+    from concurrent.futures import ProcessPoolExecutor
+    # One chunk of lists by worker, so the snapshot is sent once to each of them
+    chunks = [refs_lists[i::workers] for i in range(workers)]
+    snapshot = aggregator.snapshot()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks_results = list(executor.map(_aggregate_chunk, [snapshot] * workers, chunks))
+    # Back in the order of the lists, chunk i holds the lists i, i + workers...
+    results = [None] * len(refs_lists)
+    for i, chunk_results in enumerate(chunks_results):
+        results[i::workers] = chunk_results
+    return results
+
+
+class RunningTotals:
+    """Totals of a shopping list by (name, unit), kept up to date by adding or removing recipes"""
+
+    def __init__(self, units=None):
+        """units : UnitRegistry used to normalize the ingredients, None to keep them as they are"""
+        self.units = units
+        self.totals = {}
+        # Number of references that use each (name, unit), the total is removed when it reaches 0
+        self._counts = {}
+
+    @classmethod
+    def from_totals(cls, totals: dict, counts: dict, units=None):
+        """Build running totals from the result of Aggregator.aggregate_with_counts"""
+        running_totals = cls(units=units)
+        running_totals.totals = dict(totals)
+        running_totals._counts = dict(counts)
+        return running_totals
+
+    def _ingredients(self, batch):
+        """Yield ((name, unit), quantity) for the ingredients of the batch"""
+        for name, quantity, unit in zip(batch.names, batch.quantities, batch.units):
+            quantity = to_number(quantity)
+            if self.units is not None:
+                name, quantity, unit = self.units.normalize(name, quantity, unit)
+            yield (name, unit), quantity
+
+    def add(self, batch, quantity):
+        """Add the ingredients (IngredientBatch) of a recipe used quantity times"""
+        for key, ingredient_quantity in self._ingredients(batch):
+            value = ingredient_quantity * quantity
+            if key in self.totals:
+                self.totals[key] += value
+                self._counts[key] += 1
+            else:
+                self.totals[key] = value
+                self._counts[key] = 1
+
+    def remove(self, batch, quantity):
+        """Remove the ingredients (IngredientBatch) of a recipe used quantity times"""
+        for key, ingredient_quantity in self._ingredients(batch):
+            if key not in self.totals:
+                continue
+            self._counts[key] -= 1
+            if self._counts[key] <= 0:
+                del self.totals[key]
+                del self._counts[key]
+            else:
+                self.totals[key] -= ingredient_quantity * quantity
+
+    def update(self, batch, old_quantity, new_quantity):
+        """Change the number of times a recipe is used"""
+        for key, ingredient_quantity in self._ingredients(batch):
+            if key in self.totals:
+                self.totals[key] += ingredient_quantity * (new_quantity - old_quantity)
+
+    def matches(self, totals: dict, tolerance: float = 1e-9):
+        """Check if the running totals are equal to totals computed from scratch"""
+        if self.totals.keys() != totals.keys():
+            return False
+        return all(abs(self.totals[key] - total) <= tolerance * max(1, abs(total)) for key, total in totals.items())
@@ -0,0 +1,359 @@
+"""
+Asyncio facades of RecipesManager, ShoppingList and ShoppingLists, for asyncio applications such as web backends
+
+All the database calls run in one database thread, so the event loop never waits for the file I/O:
+- writes are queued and executed by a single writer task in batches, the database is in write behind mode and
+  written once by batch instead of once by call. The queue is bounded, a writer waits when it is full.
+- reads are not queued behind the pending writes : they run in the database thread in the order they are called,
+  after the calls of the running batch if there is one, and see the state of the last executed batch.
+- the database is written by a flush thread, the next batch waits for it but not the reads, which don't change
+  the data being written.
+
+A write returns once its batch is executed and the database written. If the database can't be written, the calls
+of the batch are still applied : their changes stay in memory and are written by the next successful flush, so
+each caller gets its own result and the error is kept in flush_error and logged. Await flush() to know that the
+changes are on the disk.
+"""
+import asyncio
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from api import Ingredient, ShoppingList, ShoppingLists
+
+LOGGER = logging.getLogger(__name__)
+
+# Default maximum number of calls executed in one batch, and of writes waiting for the writer task
+BATCH_SIZE = 100
+MAX_PENDING = 1000
+
+
+class _Backend:
+    """Database thread, flush thread and writer task shared by the facades of the same database"""
+
+    def __init__(self, database, executor: ThreadPoolExecutor, batch_size: int = BATCH_SIZE,
+                 max_pending: int = MAX_PENDING):
+        """database : ShoppingList or ShoppingLists, flushed after each batch and closed by close"""
+        self.database = database
+        self.executor = executor
+        self.flush_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-flush")
+        self.batch_size = batch_size
+        # Bounded, so a burst of writes waits in the callers instead of growing in memory
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # Held while a batch is executed and written, the data must not change while it is written
+        self.write_lock = asyncio.Lock()
+        self.writer_task = asyncio.get_event_loop().create_task(self._write_batches())
+        self.batches = 0
+        # Error of the last flush, None once the database is written
+        self.flush_error = None
+
+    async def read(self, function, *args, **kwargs):
+        """Execute function(*args, **kwargs) in the database thread, return its result"""
+        return await asyncio.get_event_loop().run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    async def write(self, function, *args, **kwargs):
+        """Queue function(*args, **kwargs) for the writer task, return its result once its batch is executed"""
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((function, args, kwargs, future))
+        return await future
+
+    @staticmethod
+    def _execute_batch(calls):
+        """Execute the calls in the database thread, return [(result, exception)]"""
+        results = []
+        for function, args, kwargs in calls:
+            try:
+                results.append((function(*args, **kwargs), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    def _flush(self):
+        """Write the database in the flush thread, keep the error instead of raising it : the changes are applied
+        in memory and stay pending, the storage writes them on its next flush"""
+        try:
+            self.database.flush()
+        except Exception as e:
+            LOGGER.error("The database could not be written, the changes are kept in memory : %s", e)
+            self.flush_error = e
+        else:
+            self.flush_error = None
+
+    async def flush(self):
+        """Wait for the queued writes and write the database, raise the error if it can't be written"""
+        await self.queue.join()
+        async with self.write_lock:
+            await asyncio.get_event_loop().run_in_executor(self.flush_executor, self.database.flush)
+        self.flush_error = None
+
+    async def _write_batches(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                async with self.write_lock:
+                    results = await loop.run_in_executor(self.executor, self._execute_batch,
+                                                         [(function, args, kwargs)
+                                                          for function, args, kwargs, _ in batch])
+                    # The reads can run in the database thread meanwhile, the next batch waits
+                    await loop.run_in_executor(self.flush_executor, self._flush)
+            except Exception as e:
+                # The batch could not be executed in the database thread
+                results = [(None, e)] * len(batch)
+            self.batches += 1
+            for (_, _, _, future), (result, exception) in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if exception is not None:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def close(self):
+        """Wait for the pending writes, close the database and stop the database thread"""
+        await self.queue.join()
+        self.writer_task.cancel()
+        await self.read(self.database.close_db)
+        self.executor.shutdown()
+        self.flush_executor.shutdown()
+
+    @classmethod
+    async def open(cls, factory, batch_size: int = BATCH_SIZE, max_pending: int = MAX_PENDING):
+        """Create the database with factory() in a new database thread"""
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        database = await asyncio.get_event_loop().run_in_executor(executor, factory)
+        return cls(database, executor, batch_size=batch_size, max_pending=max_pending)
+
+
+def _write_behind_options(options: dict):
+    """Return the options of a database in write behind mode that is only written by _Backend, after each batch"""
+    return {**options, "write_behind": True, "flush_every": math.inf, "flush_interval": math.inf}
+
+
+class AsyncRecipesManager:
+    """Asyncio facade of the RecipesManager of an AsyncShoppingList or AsyncShoppingLists, same methods as coroutines"""
+
+    def __init__(self, backend: _Backend, recipes_manager):
+        self._backend = backend
+        self._recipes_manager = recipes_manager
+
+    # CREATE
+    async def add_recipe(self, title: str, ingredients: List[Ingredient]):
+        return await self._backend.write(self._recipes_manager.add_recipe, title, ingredients)
+
+    async def add_recipes(self, recipes: Iterable[dict]):
+        return await self._backend.write(self._recipes_manager.add_recipes, list(recipes))
+
+    async def import_recipes(self, path, format: str = None):
+        return await self._backend.write(self._recipes_manager.import_recipes, path, format=format)
+
+    # READ
+    async def get_recipe_by_id(self, id):
+        return await self._backend.read(self._recipes_manager.get_recipe_by_id, id)
+
+    async def get_recipe_by_title(self, title: str):
+        return await self._backend.read(self._recipes_manager.get_recipe_by_title, title)
+
+    async def get_recipes_by_ids(self, ids):
+        return await self._backend.read(self._recipes_manager.get_recipes_by_ids, list(ids))
+
+    async def get_all_recipes(self):
+        return await self._backend.read(self._recipes_manager.get_all_recipes)
+
+    async def get_all_titles(self):
+        return await self._backend.read(self._recipes_manager.get_all_titles)
+
+    async def search(self, query: str, limit: int = None):
+        return await self._backend.read(self._recipes_manager.search, query, limit=limit)
+
+    async def get_recipes_by_ingredients(self, names: Iterable[str], match_all: bool = True):
+        return await self._backend.read(self._recipes_manager.get_recipes_by_ingredients, list(names),
+                                        match_all=match_all)
+
+    async def rank_by_pantry(self, pantry: Iterable[str], limit: int = None, min_coverage: float = 0.0):
+        return await self._backend.read(self._recipes_manager.rank_by_pantry, list(pantry), limit=limit,
+                                        min_coverage=min_coverage)
+
+    # UPDATE
+    async def update_recipe_by_title(self, title: str, ingredients: List[Ingredient]):
+        return await self._backend.write(self._recipes_manager.update_recipe_by_title, title, ingredients)
+
+    # DELETE
+    async def delete_recipe_by_title(self, title: str):
+        return await self._backend.write(self._recipes_manager.delete_recipe_by_title, title)
+
+    async def delete_recipe_by_id(self, id):
+        return await self._backend.write(self._recipes_manager.delete_recipe_by_id, id)
+
+
+class AsyncShoppingList:
+    """Asyncio facade of ShoppingList, same methods as coroutines, create it with the open coroutine
+
+    async with await AsyncShoppingList.open("db.json") as shopping_list:
+        await shopping_list.add_recipe_by_title("pasta", 2)
+        rows = await shopping_list.generate()
+    """
+
+    def __init__(self, backend: _Backend, shopping_list: ShoppingList, recipes_manager: AsyncRecipesManager = None):
+        self._backend = backend
+        self._shopping_list = shopping_list
+        self.name = shopping_list.name
+        if recipes_manager is None:
+            recipes_manager = AsyncRecipesManager(backend, shopping_list.recipes_manager)
+        self.recipes_manager = recipes_manager
+
+    @classmethod
+    async def open(cls, db_path, batch_size: int = BATCH_SIZE, max_pending: int = MAX_PENDING, **options):
+        """Open the shopping list of db_path in a new database thread
+
+        batch_size : maximum number of writes executed before the database is written
+        max_pending : maximum number of writes waiting for the writer task, the next writers wait
+        options are passed to ShoppingList (storage_format, unit_registry, name, catalog_path...), the database
+        is in write behind mode and only written at the end of each batch
+        """
+        options = _write_behind_options(options)
+        backend = await _Backend.open(lambda: ShoppingList(db_path, **options), batch_size=batch_size,
+                                      max_pending=max_pending)
+        return cls(backend, backend.database)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close_db()
+
+    async def close_db(self):
+        """Wait for the pending writes and close the database"""
+        await self._backend.close()
+
+    async def flush(self):
+        """Wait for the pending writes and write the database, raise the error if it can't be written"""
+        await self._backend.flush()
+
+    # CREATE
+    async def add_recipe_by_title(self, title: str, quantity: int = 1):
+        return await self._backend.write(self._shopping_list.add_recipe_by_title, title, quantity)
+
+    async def add_recipe_by_id(self, id, quantity):
+        return await self._backend.write(self._shopping_list.add_recipe_by_id, id, quantity)
+
+    # READ
+    async def get_recipes_by_title(self, title):
+        return await self._backend.read(self._shopping_list.get_recipes_by_title, title)
+
+    async def get_recipes_by_id(self, id):
+        return await self._backend.read(self._shopping_list.get_recipes_by_id, id)
+
+    async def get_all_recipes(self):
+        return await self._backend.read(self._shopping_list.get_all_recipes)
+
+    async def iter_rows(self, sort_by: str = None, group_by: str = None, subtract_pantry: bool = False):
+        """Return the rows (export.Row) of the shopping list as a list, see ShoppingList.iter_rows"""
+        return await self._backend.read(lambda: list(self._shopping_list.iter_rows(
+            sort_by=sort_by, group_by=group_by, subtract_pantry=subtract_pantry)))
+
+    async def export(self, file, format: str = "text", sort_by: str = None, group_by: str = None,
+                     subtract_pantry: bool = False):
+        return await self._backend.read(self._shopping_list.export, file, format=format, sort_by=sort_by,
+                                        group_by=group_by, subtract_pantry=subtract_pantry)
+
+    # UPDATE
+    async def update_recipe_by_title(self, title, quantity):
+        return await self._backend.write(self._shopping_list.update_recipe_by_title, title, quantity)
+
+    async def update_recipe_by_id(self, id, quantity):
+        return await self._backend.write(self._shopping_list.update_recipe_by_id, id, quantity)
+
+    # DELETE
+    async def delete_recipe_by_title(self, title: str):
+        return await self._backend.write(self._shopping_list.delete_recipe_by_title, title)
+
+    async def delete_recipe_by_id(self, id):
+        return await self._backend.write(self._shopping_list.delete_recipe_by_id, id)
+
+    async def clear(self):
+        return await self._backend.write(self._shopping_list.clear)
+
+    # GENERATE, writes the shopping_list table
+    async def generate(self, rebuild: bool = False, subtract_pantry: bool = False):
+        """Generate the list of ingredients with quantities, see ShoppingList.generate"""
+        return await self._backend.write(self._shopping_list.generate, rebuild=rebuild,
+                                         subtract_pantry=subtract_pantry)
+
+
+class AsyncShoppingLists:
+    """Asyncio facade of ShoppingLists, create it with the open coroutine
+
+    The lists returned by get share the database thread, the writer task and the recipes manager
+    """
+
+    def __init__(self, backend: _Backend):
+        self._backend = backend
+        self._shopping_lists = backend.database
+        self.recipes_manager = AsyncRecipesManager(backend, self._shopping_lists.recipes_manager)
+        # name -> AsyncShoppingList
+        self._lists = {}
+
+    @classmethod
+    async def open(cls, db_path, batch_size: int = BATCH_SIZE, max_pending: int = MAX_PENDING, **options):
+        """Open the lists of db_path in a new database thread, see AsyncShoppingList.open for the options"""
+        options = _write_behind_options(options)
+        backend = await _Backend.open(lambda: ShoppingLists(db_path, **options), batch_size=batch_size,
+                                      max_pending=max_pending)
+        return cls(backend)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close_db()
+
+    async def close_db(self):
+        """Wait for the pending writes and close the database"""
+        await self._backend.close()
+
+    async def flush(self):
+        """Wait for the pending writes and write the database, raise the error if it can't be written"""
+        await self._backend.flush()
+
+    async def names(self):
+        return await self._backend.read(self._shopping_lists.names)
+
+    async def get(self, name: str, create: bool = True):
+        """Return the AsyncShoppingList named name, create it if needed, None if it doesn't exist and create is
+        False"""
+        shopping_list = self._lists.get(name)
+        if shopping_list is not None:
+            return shopping_list
+        get = self._backend.write if create else self._backend.read
+        shopping_list = await get(self._shopping_lists.get, name, create=create)
+        if shopping_list is None:
+            return None
+        return self._lists.setdefault(name, AsyncShoppingList(self._backend, shopping_list,
+                                                              recipes_manager=self.recipes_manager))
+
+    async def rename(self, name: str, new_name: str):
+        """Rename a list, see ShoppingLists.rename"""
+        self._lists.pop(name, None)
+        return await self._backend.write(self._shopping_lists.rename, name, new_name)
+
+    async def delete(self, name: str):
+        """Delete a list and its tables, return False if it doesn't exist"""
+        self._lists.pop(name, None)
+        return await self._backend.write(self._shopping_lists.delete, name)
+
+    async def generate(self, name: str, rebuild: bool = False, subtract_pantry: bool = False):
+        """Generate the list named name, see ShoppingLists.generate"""
+        return await self._backend.write(self._shopping_lists.generate, name, rebuild=rebuild,
+                                         subtract_pantry=subtract_pantry)
+
+    async def generate_many(self, names: Iterable[str] = None, workers: int = 1, rebuild: bool = False,
+                            subtract_pantry: bool = False):
+        """Generate several lists (all by default), see ShoppingLists.generate_many"""
+        return await self._backend.write(self._shopping_lists.generate_many, None if names is None else list(names),
+                                         workers=workers, rebuild=rebuild, subtract_pantry=subtract_pantry)
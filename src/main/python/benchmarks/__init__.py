@@ -0,0 +1,4 @@
+"""
+Benchmarks scripts, launch them from src/main/python with :
+python -m benchmarks.<module>
+"""
@@ -0,0 +1,42 @@
+"""
+Benchmark of the Aggregator with NumPy and with the pure Python fallback
+
+python -m benchmarks.bench_aggregation
+"""
+from aggregation import NUMPY_AVAILABLE, Aggregator
+from api import IngredientBatch
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 20000
+LIST_SIZES = [100, 1000, 10000]
+
+
+def run():
+    recipes = make_recipes(CATALOG_SIZE)
+    modes = [False, True] if NUMPY_AVAILABLE else [False]
+    print(f"{'list':>6} {'mode':>7} {'encode (ms)':>12} {'first (ms)':>11} {'next (ms)':>10}")
+    for list_size in LIST_SIZES:
+        recipes_refs = make_recipes_refs(list_size, CATALOG_SIZE)
+        used_ids = {recipe_ref["recipe_id"] for recipe_ref in recipes_refs}
+        for use_numpy in modes:
+            results = {}
+            aggregator = Aggregator(use_numpy=use_numpy)
+            with timer(results, "encode"):
+                for recipe in recipes:
+                    if recipe["id"] in used_ids:
+                        aggregator.encode(recipe["id"], IngredientBatch.from_json(recipe["ingredients"]))
+            # The first aggregation after an encoding also builds the NumPy arrays
+            with timer(results, "first"):
+                aggregator.aggregate(recipes_refs)
+            with timer(results, "next"):
+                aggregator.aggregate(recipes_refs)
+            mode = "numpy" if use_numpy else "python"
+            print(f"{list_size:>6} {mode:>7} {results['encode'] * 1000:>12.1f} {results['first'] * 1000:>11.1f} "
+                  f"{results['next'] * 1000:>10.1f}")
+    if not NUMPY_AVAILABLE:
+        print("numpy is not installed, only the pure Python fallback is measured")
+
+
+if __name__ == '__main__':
+    run()
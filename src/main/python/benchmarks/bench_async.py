@@ -0,0 +1,65 @@
+"""
+Benchmark of concurrent writes from asyncio : one thread call by write against AsyncShoppingList batches
+
+python -m benchmarks.bench_async
+"""
+import asyncio
+import shutil
+import tempfile
+from pathlib import Path
+
+from api import RecipesManager, ShoppingList
+from async_api import AsyncShoppingList
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 2000
+CONCURRENT_WRITES = [10, 100, 500]
+
+
+async def write_one_by_one(db_path, recipes_refs):
+    """Each write is executed in a thread and rewrites the database, a lock keeps TinyDB in one thread at a time"""
+    shopping_list = ShoppingList(db_path)
+    lock = asyncio.Lock()
+
+    async def add(recipe_ref):
+        async with lock:
+            await asyncio.get_event_loop().run_in_executor(None, shopping_list.add_recipe_by_id,
+                                                           recipe_ref["recipe_id"], recipe_ref["quantity"])
+
+    await asyncio.gather(*(add(recipe_ref) for recipe_ref in recipes_refs))
+    shopping_list.close_db()
+
+
+async def write_batched(db_path, recipes_refs):
+    async with await AsyncShoppingList.open(db_path) as shopping_list:
+        await asyncio.gather(*(shopping_list.add_recipe_by_id(recipe_ref["recipe_id"], recipe_ref["quantity"])
+                               for recipe_ref in recipes_refs))
+        return shopping_list._backend.batches
+
+
+def run():
+    print(f"{'writes':>7} {'one by one (s)':>15} {'batched (s)':>12} {'batches':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        catalog_path = Path(tmp_dir) / "catalog.json"
+        recipes_manager = RecipesManager(catalog_path)
+        recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+        recipes_manager.db.close()
+
+        for writes in CONCURRENT_WRITES:
+            recipes_refs = make_recipes_refs(writes, CATALOG_SIZE)
+            results = {}
+            for mode, write in (("one_by_one", write_one_by_one), ("batched", write_batched)):
+                db_path = Path(tmp_dir) / f"{mode}_{writes}.json"
+                shutil.copy(catalog_path, db_path)
+                loop = asyncio.new_event_loop()
+                with timer(results, mode):
+                    results[f"{mode}_result"] = loop.run_until_complete(write(db_path, recipes_refs))
+                loop.close()
+
+            print(f"{writes:>7} {results['one_by_one']:>15.2f} {results['batched']:>12.2f} "
+                  f"{results['batched_result']:>8}")
+
+
+if __name__ == '__main__':
+    run()
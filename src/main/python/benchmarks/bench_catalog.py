@@ -0,0 +1,77 @@
+"""
+Memory and lookup time of a large catalog : TinyDB RecipesManager against the memory-mapped CatalogRecipesManager
+
+Each manager is measured in a new process. The memory is read in /proc/self/status (Linux) after the lookups,
+above the one after the imports : private memory of the process, and pages of files mapped in memory which are
+shared with the page cache and can be reclaimed by the system.
+
+python -m benchmarks.bench_catalog
+"""
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from api import RecipesManager
+from catalog import CatalogRecipesManager
+
+from .utils import make_recipes, timer
+
+CATALOG_SIZE = 200000
+LOOKUPS = {"tinydb": 1000, "catalog": 1000}
+# The TinyDB database is written compact to save time, the memory used once it is parsed is the same
+STORAGE_FORMAT = "compact"
+
+
+def resident_memory():
+    """Return (private, mapped files) resident memory of the process in Mo"""
+    with open("/proc/self/status") as f:
+        status = dict(line.split(":", 1) for line in f)
+    return tuple(int(status[key].split()[0]) / 1024 for key in ("RssAnon", "RssFile"))
+
+
+def measure(manager: str, path: str):
+    """Open the manager on path and look up recipes by id and title, print the results on one line"""
+    base_memory = resident_memory()
+    rng = random.Random(0)
+    ids = [str(rng.randint(1, CATALOG_SIZE)) for _ in range(LOOKUPS[manager])]
+    results = {}
+    with timer(results, "open"):
+        if manager == "tinydb":
+            recipes_manager = RecipesManager(path, storage_format=STORAGE_FORMAT)
+        else:
+            recipes_manager = CatalogRecipesManager(path)
+    with timer(results, "lookups"):
+        for id in ids:
+            recipe = recipes_manager.get_recipe_by_id(id)
+            recipes_manager.get_recipe_by_title(recipe["title"])
+    private, mapped = (memory - base for memory, base in zip(resident_memory(), base_memory))
+    print(f"{manager:>8} {results['open']:>9.2f} {results['lookups'] / len(ids) * 1e3:>12.3f} {private:>13.1f} "
+          f"{mapped:>12.1f}")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.json"
+        catalog_path = Path(tmp_dir) / "bench.catalog"
+        results = {}
+        recipes_manager = RecipesManager(db_path, storage_format=STORAGE_FORMAT)
+        recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+        with timer(results, "build"):
+            recipes_manager.build_catalog(catalog_path)
+        recipes_manager.db.close()
+        print(f"{CATALOG_SIZE} recipes, catalog built in {results['build']:.2f} s "
+              f"({catalog_path.stat().st_size / 1e6:.0f} Mo, database {db_path.stat().st_size / 1e6:.0f} Mo)")
+
+        print(f"{'manager':>8} {'open (s)':>9} {'lookup (ms)':>12} {'private (Mo)':>13} {'mapped (Mo)':>12}")
+        for manager, path in (("tinydb", db_path), ("catalog", catalog_path)):
+            sys.stdout.flush()
+            subprocess.run([sys.executable, "-m", __spec__.name, manager, str(path)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        run()
@@ -0,0 +1,53 @@
+"""
+Benchmark of ShoppingList.generate according to the size of the list and of the catalog
+
+python -m benchmarks.bench_generate
+"""
+import tempfile
+from pathlib import Path
+
+from api import ShoppingList
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZES = [1000, 5000, 20000]
+LIST_SIZES = [10, 100, 500]
+# generate_by_id is only measured below this size (catalog x list), each call reads the database file
+BY_ID_LIMIT = 500_000
+
+
+def generate_by_id(shopping_list: ShoppingList):
+    """One get_recipe_by_id call per reference of the list, with the id index and cache of the current
+    RecipesManager (not the table scan by reference of the original implementation)"""
+    result = {}
+    for recipe_ref in shopping_list.recipes_list.all():
+        recipe = shopping_list.recipes_manager.get_recipe_by_id(recipe_ref["recipe_id"])
+        for ingredient in recipe["ingredients"]:
+            key = (ingredient.name, ingredient.unit)
+            result[key] = result.get(key, 0) + ingredient.quantity * recipe_ref["quantity"]
+    return result
+
+
+def run():
+    print(f"{'catalog':>8} {'list':>6} {'by id (s)':>12} {'generate (s)':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for catalog_size in CATALOG_SIZES:
+            for list_size in LIST_SIZES:
+                db_path = Path(tmp_dir) / f"bench_{catalog_size}_{list_size}.json"
+                shopping_list = ShoppingList(db_path)
+                shopping_list.recipes_manager.recipes.insert_multiple(make_recipes(catalog_size))
+                shopping_list.recipes_list.insert_multiple(make_recipes_refs(list_size, catalog_size))
+
+                results = {"by_id": float("nan")}
+                if catalog_size * list_size <= BY_ID_LIMIT:
+                    with timer(results, "by_id"):
+                        generate_by_id(shopping_list)
+                with timer(results, "generate"):
+                    shopping_list.generate()
+                shopping_list.db.close()
+
+                print(f"{catalog_size:>8} {list_size:>6} {results['by_id']:>12.3f} {results['generate']:>13.3f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,43 @@
+"""
+Benchmark of ShoppingLists.generate_all against generating each named list on its own
+
+python -m benchmarks.bench_generate_all
+"""
+import tempfile
+from pathlib import Path
+
+from api import ShoppingList, ShoppingLists
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 2000
+LIST_SIZE = 100
+LISTS_COUNTS = [1, 10, 30]
+
+
+def run():
+    print(f"{'lists':>6} {'one by one (s)':>15} {'generate_all (s)':>17}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for lists_count in LISTS_COUNTS:
+            db_path = Path(tmp_dir) / f"bench_{lists_count}.json"
+            shopping_lists = ShoppingLists(db_path)
+            shopping_lists.recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+            names = [f"list {i}" for i in range(lists_count)]
+            for i, name in enumerate(names):
+                shopping_lists.get(name).recipes_list.insert_multiple(make_recipes_refs(LIST_SIZE, CATALOG_SIZE,
+                                                                                        seed=i))
+
+            results = {}
+            with timer(results, "one_by_one"):
+                # Each list has its own aggregator and decodes its recipes from the catalog
+                for name in names:
+                    ShoppingList(shopping_lists.db, name=name, recipes_manager=shopping_lists.recipes_manager).generate()
+            with timer(results, "generate_all"):
+                shopping_lists.generate_all()
+            shopping_lists.close_db()
+
+            print(f"{lists_count:>6} {results['one_by_one']:>15.3f} {results['generate_all']:>17.3f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,44 @@
+"""
+Benchmark of ShoppingLists.generate_many according to the number of worker processes
+
+python -m benchmarks.bench_generate_many
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from api import ShoppingLists
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 5000
+LIST_SIZE = 500
+LISTS_COUNT = 300
+WORKERS = [1, 2, 4, os.cpu_count()]
+
+
+def run():
+    print(f"{LISTS_COUNT} lists of {LIST_SIZE} recipes, catalog of {CATALOG_SIZE} recipes")
+    print(f"{'workers':>8} {'generate_many (s)':>18}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.json"
+        shopping_lists = ShoppingLists(db_path, storage_format="compact", write_behind=True)
+        shopping_lists.recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+        for i in range(LISTS_COUNT):
+            shopping_lists.get(f"list {i}").recipes_list.insert_multiple(make_recipes_refs(LIST_SIZE, CATALOG_SIZE,
+                                                                                           seed=i))
+        shopping_lists.close_db()
+
+        for workers in sorted(set(WORKERS)):
+            # A new instance for each run so the recipes are decoded and the totals aggregated again
+            shopping_lists = ShoppingLists(db_path, storage_format="compact", write_behind=True)
+            results = {}
+            with timer(results, "generate_many"):
+                shopping_lists.generate_many(workers=workers)
+            shopping_lists.close_db()
+
+            print(f"{workers:>8} {results['generate_many']:>18.3f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,60 @@
+"""
+Memory used by 1M ingredients : previous Ingredient class with a __dict__, slotted Ingredient and IngredientBatch
+
+python -m benchmarks.bench_ingredients_memory
+"""
+import gc
+import tracemalloc
+
+from api import Ingredient, IngredientBatch
+
+from .utils import make_recipes, timer
+
+INGREDIENTS_COUNT = 1_000_000
+INGREDIENTS_PER_RECIPE = 10
+
+
+class DictIngredient:
+    """Previous implementation of Ingredient"""
+
+    def __init__(self, name: str, quantity: int, unit: str):
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit
+
+
+def measure(build, raw_recipes):
+    """Return (time in s, memory in Mo) used to decode all the raw recipes with build"""
+    results = {}
+    gc.collect()
+    tracemalloc.start()
+    with timer(results, "decode"):
+        decoded = [build(recipe["ingredients"]) for recipe in raw_recipes]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return results["decode"], current / 1e6
+
+
+def run():
+    # Raw recipes are decoded from JSON so the strings are not shared, like when reading the database
+    raw_recipes = make_recipes(INGREDIENTS_COUNT // INGREDIENTS_PER_RECIPE, INGREDIENTS_PER_RECIPE)
+    for recipe in raw_recipes:
+        for ingredient in recipe["ingredients"]:
+            ingredient["name"] = "".join(ingredient["name"])
+            ingredient["unit"] = "".join(ingredient["unit"])
+
+    builders = {
+        "dict Ingredient": lambda data: [DictIngredient(**ingredient) for ingredient in data],
+        "slots Ingredient": lambda data: [Ingredient.from_json(ingredient) for ingredient in data],
+        "IngredientBatch": IngredientBatch.from_json,
+    }
+    print(f"{INGREDIENTS_COUNT} ingredients")
+    print(f"{'representation':>17} {'decode (s)':>11} {'memory (Mo)':>12}")
+    for name, build in builders.items():
+        seconds, memory = measure(build, raw_recipes)
+        print(f"{name:>17} {seconds:>11.2f} {memory:>12.1f}")
+
+
+if __name__ == '__main__':
+    run()
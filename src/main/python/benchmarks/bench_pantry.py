@@ -0,0 +1,66 @@
+"""
+Benchmark of the pantry stock sync in one write against one upsert by item, and of generate with the pantry
+
+python -m benchmarks.bench_pantry
+"""
+import random
+import tempfile
+from pathlib import Path
+
+from tinydb import Query
+
+from api import ShoppingList
+
+from .utils import INGREDIENTS_NAMES, UNITS, make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 2000
+LIST_SIZE = 100
+STOCK_SIZES = [100, 1000, 5000]
+# Syncing item by item with upserts of the pantry table, what Pantry avoids, rewrites the database for each item,
+# too slow beyond that
+MAX_ONE_BY_ONE = 100
+
+
+def make_stock(count: int, seed: int = 0):
+    """Return stock items, the recipes ingredients first so they are subtracted from the lists"""
+    rng = random.Random(seed)
+    names = INGREDIENTS_NAMES + [f"stock_{i}" for i in range(count)]
+    return [{"name": name, "quantity": rng.randint(1, 2000), "unit": rng.choice(UNITS)} for name in names[:count]]
+
+
+def run():
+    print(f"{'items':>6} {'one by one (s)':>15} {'set_items (s)':>14} {'adjust_items (s)':>17} "
+          f"{'generate (s)':>13} {'net (s)':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for stock_size in STOCK_SIZES:
+            db_path = Path(tmp_dir) / f"bench_{stock_size}.json"
+            shopping_list = ShoppingList(db_path)
+            shopping_list.recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+            shopping_list.recipes_list.insert_multiple(make_recipes_refs(LIST_SIZE, CATALOG_SIZE))
+            stock = make_stock(stock_size)
+
+            results = {}
+            if stock_size <= MAX_ONE_BY_ONE:
+                with timer(results, "one_by_one"):
+                    Item = Query()
+                    for item in stock:
+                        shopping_list.pantry.table.upsert(item, (Item.name == item["name"]) &
+                                                          (Item.unit == item["unit"]))
+                shopping_list.pantry.table.truncate()
+            with timer(results, "set_items"):
+                shopping_list.pantry.set_items(stock, replace=True)
+            with timer(results, "adjust_items"):
+                shopping_list.pantry.adjust_items({**item, "quantity": -1} for item in stock)
+            with timer(results, "generate"):
+                shopping_list.generate()
+            with timer(results, "net"):
+                shopping_list.generate(subtract_pantry=True)
+            shopping_list.close_db()
+
+            one_by_one = f"{results['one_by_one']:>15.3f}" if "one_by_one" in results else f"{'-':>15}"
+            print(f"{stock_size:>6} {one_by_one} {results['set_items']:>14.3f} {results['adjust_items']:>17.3f} "
+                  f"{results['generate']:>13.3f} {results['net']:>8.3f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,44 @@
+"""
+Benchmark of RecipesManager.get_recipe_by_id with and without the decoded recipes cache
+
+python -m benchmarks.bench_recipe_cache
+"""
+import random
+import tempfile
+from pathlib import Path
+
+from api import RecipesManager
+
+from .utils import make_recipes, timer
+
+CATALOG_SIZE = 2000
+LOOKUPS = 500
+# Number of distinct recipes looked up, like the recipes of a list refreshed by the GUI
+HOT_RECIPES = 50
+
+
+def run():
+    print(f"{'cache size':>10} {'lookups (s)':>12}  counters")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.json"
+        recipes_manager = RecipesManager(db_path)
+        recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+        recipes_manager.db.close()
+
+        rng = random.Random(0)
+        hot_ids = [str(rng.randint(1, CATALOG_SIZE)) for _ in range(HOT_RECIPES)]
+        ids = [rng.choice(hot_ids) for _ in range(LOOKUPS)]
+
+        for cache_size in [0, HOT_RECIPES // 2, 256]:
+            recipes_manager = RecipesManager(db_path, cache_size=cache_size)
+            results = {}
+            with timer(results, "lookups"):
+                for id in ids:
+                    recipes_manager.get_recipe_by_id(id)
+            recipes_manager.db.close()
+
+            print(f"{cache_size:>10} {results['lookups']:>12.3f}  {recipes_manager.cache_info()}")
+
+
+if __name__ == '__main__':
+    run()
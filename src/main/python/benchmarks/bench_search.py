@@ -0,0 +1,78 @@
+"""
+Benchmark of the recipes search and of the ingredients index according to the size of the catalog
+
+python -m benchmarks.bench_search
+"""
+import random
+import time
+
+from search import IngredientsIndex, SearchIndex
+
+from .utils import timer
+
+CATALOG_SIZES = [1000, 10000, 100000]
+QUERIES = ["tarte", "tarte pommes", "gratin dauphinois", "creme brulee", "chocolat", "pomes", "boeuf carottes",
+           "quiche lorraine lardons", "xyz", "tarte 12", "12 34 56"]
+REPEAT = 20
+INGREDIENTS_QUERIES = [("with_all", ["tomates", "courgettes"]), ("with_any", ["reblochon", "lardons"]),
+                       ("coverage", ["pommes", "farine", "beurre", "sucre", "œufs", "lait"])]
+
+DISHES = ["tarte", "gratin", "quiche", "soupe", "velouté", "gâteau", "crème", "salade", "tartiflette", "blanquette",
+          "bœuf", "poulet", "ratatouille", "clafoutis", "crêpes", "galette", "cassoulet", "fondue", "raclette",
+          "mousse", "flan", "brioche", "terrine", "pot-au-feu", "choucroute", "gaufres", "madeleines", "financiers"]
+QUALIFIERS = ["aux pommes", "au chocolat", "dauphinois", "lorraine", "bourguignon", "à l'orange", "aux carottes",
+              "de légumes", "brûlée", "au fromage", "aux poireaux", "niçoise", "provençale", "normande", "du chef",
+              "de grand-mère", "express", "végétarienne", "aux champignons", "au citron", "aux épinards"]
+INGREDIENTS = ["pommes", "farine", "beurre", "sucre", "œufs", "lait", "crème fraîche", "chocolat noir", "lardons",
+               "carottes", "poireaux", "oignons", "ail", "gruyère râpé", "reblochon", "pommes de terre", "bœuf",
+               "poulet", "champignons", "citron", "épinards", "courgettes", "aubergines", "tomates", "levure",
+               "sel", "poivre", "huile d'olive", "vin rouge", "bouillon", "persil", "thym", "laurier"]
+
+
+def make_catalog(count: int, seed: int = 0):
+    """Return [(id, title, ingredients names)] of recipes with French titles"""
+    rng = random.Random(seed)
+    return [(str(i), f"{rng.choice(DISHES)} {rng.choice(QUALIFIERS)} {i}", rng.sample(INGREDIENTS, 8))
+            for i in range(1, count + 1)]
+
+
+def run():
+    print(f"{'catalog':>8} {'build (s)':>10} {'query':>26} {'results':>8} {'ms':>8}")
+    for catalog_size in CATALOG_SIZES:
+        catalog = make_catalog(catalog_size)
+        results = {}
+        with timer(results, "build"):
+            index = SearchIndex()
+            for id, title, ingredients_names in catalog:
+                index.add(id, title, ingredients_names)
+
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                found = index.search(query, limit=50)
+            milliseconds = (time.perf_counter() - start) / REPEAT * 1000
+            print(f"{catalog_size:>8} {results['build']:>10.2f} {query:>26} {len(found):>8} {milliseconds:>8.2f}")
+
+    print()
+    print(f"{'catalog':>8} {'build (s)':>10} {'query':>26} {'results':>8} {'ms':>8}")
+    for catalog_size in CATALOG_SIZES:
+        catalog = make_catalog(catalog_size)
+        results = {}
+        with timer(results, "build"):
+            index = IngredientsIndex()
+            for id, _, ingredients_names in catalog:
+                index.add(id, ingredients_names)
+
+        for method, names in INGREDIENTS_QUERIES:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                if method == "coverage":
+                    found = index.coverage(names, limit=20)
+                else:
+                    found = getattr(index, method)(names)
+            milliseconds = (time.perf_counter() - start) / REPEAT * 1000
+            print(f"{catalog_size:>8} {results['build']:>10.2f} {method:>26} {len(found):>8} {milliseconds:>8.2f}")
+
+
+if __name__ == '__main__':
+    run()
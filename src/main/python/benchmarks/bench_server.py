@@ -0,0 +1,164 @@
+"""
+Load generator of the HTTP service (server.py) : concurrent clients on keep-alive connections, a mix of reads,
+writes and exports, throughput and latencies by kind of request
+
+Without --url, a server is started in a new process on a copy of a generated catalog, once with a batch of one
+write (the database is written by each write request) and once with the default write coalescing.
+
+python -m benchmarks.bench_server
+python -m benchmarks.bench_server --url http://127.0.0.1:8080 --clients 16 --requests 200
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from api import RecipesManager
+from async_api import BATCH_SIZE
+
+from .utils import make_recipes
+
+CATALOG_SIZE = 1000
+CLIENTS = [4, 16]
+REQUESTS_BY_CLIENT = 50
+# Kind of request -> weight in the mix
+MIX = {"get": 50, "search": 20, "add": 25, "export": 5}
+# Batch sizes of the servers started by the benchmark, 1 writes the database by each write request
+BATCH_SIZES = [1, BATCH_SIZE]
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Client:
+    """Keep-alive connection to the server"""
+
+    def __init__(self, url: str):
+        url = urlsplit(url)
+        self.connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+
+    def request(self, method: str, path: str, body=None):
+        """Send a request and return (status, body bytes)"""
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.will_close:
+            self.connection.close()
+        return response.status, data
+
+    def close(self):
+        self.connection.close()
+
+
+def run_client(url: str, client_id: int, requests: int, recipe_ids: list, latencies: dict, errors: list):
+    """Send requests of the mix, append the latencies by kind (in s)"""
+    rng = random.Random(client_id)
+    client = Client(url)
+    list_path = f"/lists/{quote(f'bench_{client_id}')}"
+    client.request("POST", "/lists", {"name": f"bench_{client_id}"})
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=requests)
+    for kind in kinds:
+        if kind == "get":
+            request = ("GET", f"/recipes/{rng.choice(recipe_ids)}")
+        elif kind == "search":
+            request = ("GET", f"/recipes?q=ingredient_{rng.randrange(500)}&limit=20")
+        elif kind == "add":
+            request = ("POST", f"{list_path}/recipes", {"recipe_id": rng.choice(recipe_ids), "quantity": 1})
+        else:
+            request = ("GET", f"{list_path}/export?format=csv")
+        start = time.perf_counter()
+        status, _ = client.request(*request)
+        latencies[kind].append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append((request, status))
+    client.close()
+
+
+def percentile(values: list, part: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * part))]
+
+
+def load(url: str, clients: int, requests: int):
+    """Run clients threads of requests each on the server at url, print one line of results"""
+    status, data = Client(url).request("GET", "/recipes")
+    recipe_ids = [recipe["id"] for recipe in json.loads(data)]
+    latencies = {kind: [] for kind in MIX}
+    errors = []
+    threads = [threading.Thread(target=run_client, args=(url, client_id, requests, recipe_ids, latencies, errors))
+               for client_id in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    count = sum(len(values) for values in latencies.values())
+    columns = " ".join(f"{percentile(latencies[kind], 0.5) * 1e3:>7.1f} {percentile(latencies[kind], 0.95) * 1e3:>7.1f}"
+                       for kind in MIX)
+    print(f"{clients:>7} {count / duration:>8.1f} {columns} {len(errors):>6}")
+
+
+def print_header():
+    columns = " ".join(f"{kind + ' p50':>7} {'p95':>7}" for kind in MIX)
+    print(f"{'clients':>7} {'req/s':>8} {columns} {'errors':>6}    (latencies in ms)")
+
+
+def start_server(db_path, batch_size: int):
+    """Start server.py on db_path in a new process, return (process, url)"""
+    process = subprocess.Popen([sys.executable, "server.py", str(db_path), "--port", "0", "--quiet",
+                                "--batch-size", str(batch_size)], cwd=SOURCE_DIR, stdout=subprocess.PIPE,
+                               universal_newlines=True)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError("the server did not start")
+    return process, line.split()[-1]
+
+
+def run(clients_counts=CLIENTS, requests: int = REQUESTS_BY_CLIENT):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        catalog_path = Path(tmp_dir) / "catalog.json"
+        recipes_manager = RecipesManager(catalog_path)
+        recipes_manager.recipes.insert_multiple(make_recipes(CATALOG_SIZE))
+        recipes_manager.db.close()
+
+        for batch_size in BATCH_SIZES:
+            print(f"{CATALOG_SIZE} recipes, batch_size={batch_size}")
+            print_header()
+            for clients in clients_counts:
+                db_path = Path(tmp_dir) / f"bench_{batch_size}_{clients}.json"
+                db_path.write_bytes(catalog_path.read_bytes())
+                process, url = start_server(db_path, batch_size)
+                try:
+                    load(url, clients, requests)
+                finally:
+                    process.terminate()
+                    process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test of the PyShopping HTTP service")
+    parser.add_argument("--url", help="server to load, started on a generated catalog if not given")
+    parser.add_argument("--clients", type=int, nargs="+", default=CLIENTS)
+    parser.add_argument("--requests", type=int, default=REQUESTS_BY_CLIENT, help="requests by client")
+    args = parser.parse_args()
+
+    if args.url:
+        print_header()
+        for clients in args.clients:
+            load(args.url, clients, args.requests)
+    else:
+        run(args.clients, args.requests)
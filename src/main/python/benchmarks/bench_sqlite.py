@@ -0,0 +1,38 @@
+"""
+Benchmark of SQLiteShoppingList.generate on a large catalog
+
+python -m benchmarks.bench_sqlite
+"""
+import tempfile
+from pathlib import Path
+
+from sqlite_api import SQLiteShoppingList
+
+from .utils import make_recipes, make_recipes_refs, timer
+
+CATALOG_SIZE = 100000
+LIST_SIZES = [10, 100, 1000]
+
+
+def run():
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shopping_list = SQLiteShoppingList(Path(tmp_dir) / "bench.sqlite")
+        with timer(results, "import"):
+            shopping_list.recipes_manager.add_recipes(make_recipes(CATALOG_SIZE))
+        print(f"import of {CATALOG_SIZE} recipes : {results['import']:.2f} s")
+
+        print(f"{'list':>6} {'generate (ms)':>14}")
+        for list_size in LIST_SIZES:
+            with shopping_list.connection:
+                shopping_list.connection.execute("DELETE FROM recipes_list")
+            for recipe_ref in make_recipes_refs(list_size, CATALOG_SIZE):
+                shopping_list.add_recipe_by_id(recipe_ref["recipe_id"], recipe_ref["quantity"])
+            with timer(results, "generate"):
+                shopping_list.generate()
+            print(f"{list_size:>6} {results['generate'] * 1000:>14.1f}")
+        shopping_list.close_db()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the startup : time to import the modules in a new interpreter, measured with python -X importtime
+
+python -m benchmarks.bench_startup
+"""
+import os
+import subprocess
+import sys
+import time
+
+# Modules imported at startup by the applications, main needs fbs_runtime and PySide2
+MODULES = ["api", "sqlite_api", "interface.main_window", "main"]
+REPEAT = 5
+# Number of slowest imports listed by module
+TOP = 5
+# Target of the cold start of the kiosk machines
+BUDGET = 1.0
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str):
+    """Import module in a new interpreter, return (wall time in s, {imported module: (self us, cumulative us)})"""
+    # Bytecode is written like on an installed machine, else the modules are compiled by each run
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SOURCE_DIR,
+                             env=env, stderr=subprocess.PIPE, universal_newlines=True)
+    wall_time = time.perf_counter() - start
+    if process.returncode != 0:
+        raise ImportError(process.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return wall_time, times
+
+
+def run():
+    if sys.version_info < (3, 7):
+        print("python -X importtime needs python 3.7, benchmark skipped")
+        return
+    print(f"{'module':>22} {'import (ms)':>12} {'process (ms)':>13}  slowest imports (self ms)")
+    for module in MODULES:
+        try:
+            runs = [import_times(module) for _ in range(REPEAT)]
+        except ImportError as e:
+            print(f"{module:>22} not importable : {e}")
+            continue
+        wall_time, times = min(runs, key=lambda run: run[0])
+        slowest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:TOP]
+        slowest = ", ".join(f"{name} {self_us / 1000:.1f}" for name, (self_us, _) in slowest)
+        over_budget = "  OVER BUDGET" if wall_time > BUDGET else ""
+        print(f"{module:>22} {times[module][1] / 1000:>12.1f} {wall_time * 1000:>13.1f}  {slowest}{over_budget}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,47 @@
+"""
+Benchmark of the on-disk formats : file size, write time, load time and memory used by the load
+
+python -m benchmarks.bench_storage_formats
+"""
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from storages import FORMATS, open_db, msgpack
+
+from .utils import make_recipes, timer
+
+CATALOG_SIZE = 20000
+
+
+def run():
+    recipes = make_recipes(CATALOG_SIZE)
+    print(f"{'format':>8} {'size (Mo)':>10} {'write (s)':>10} {'load (s)':>9} {'memory (Mo)':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage_format in FORMATS:
+            if storage_format == "msgpack" and msgpack is None:
+                print(f"{storage_format:>8} msgpack is not installed")
+                continue
+            db_path = Path(tmp_dir) / f"bench.{storage_format}"
+            results = {}
+
+            db = open_db(db_path, storage_format=storage_format)
+            with timer(results, "write"):
+                db.table("recipes").insert_multiple(recipes)
+            db.close()
+
+            tracemalloc.start()
+            with timer(results, "load"):
+                db = open_db(db_path, storage_format=storage_format)
+                db.table("recipes").all()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            db.close()
+
+            size = db_path.stat().st_size / 1e6
+            print(f"{storage_format:>8} {size:>10.2f} {results['write']:>10.3f} {results['load']:>9.3f} "
+                  f"{peak / 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,38 @@
+import random
+import time
+from contextlib import contextmanager
+
+INGREDIENTS_NAMES = [f"ingredient_{i}" for i in range(500)]
+UNITS = ["g", "kg", "l", "cl", "pièce"]
+
+
+def make_recipes(count: int, ingredients_per_recipe: int = 8, seed: int = 0):
+    """Return a list of raw recipes documents (as stored by RecipesManager)"""
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(1, count + 1):
+        ingredients = [{"name": rng.choice(INGREDIENTS_NAMES),
+                        "quantity": rng.randint(1, 500),
+                        "unit": rng.choice(UNITS)}
+                       for _ in range(ingredients_per_recipe)]
+        recipes.append({"title": f"recipe {i}",
+                        "ingredients": ingredients,
+                        "id": str(i)})
+    return recipes
+
+
+def make_recipes_refs(count: int, catalog_size: int, seed: int = 0):
+    """Return a list of raw recipes_list documents pointing to random recipes"""
+    rng = random.Random(seed)
+    return [{"recipe_id": str(rng.randint(1, catalog_size)),
+             "quantity": rng.randint(1, 10),
+             "id": str(i)}
+            for i in range(1, count + 1)]
+
+
+@contextmanager
+def timer(results: dict, key):
+    """Store in results[key] the time spent in the with block (in seconds)"""
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
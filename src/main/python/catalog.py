@@ -0,0 +1,275 @@
+"""
+Read-only recipes catalog : a prebuilt file memory-mapped and decoded recipe by recipe
+
+File layout, all integers little-endian :
+- header : magic, format version, number of recipes and offsets of the sections below
+- records : each recipe as compact JSON ({"title", "ingredients", "id"} like in the recipes table)
+- keys : the ids and titles in UTF-8
+- entries : one (id offset, id length, title offset, title length, record offset, record length) by recipe
+- by_id, by_title : positions of the entries sorted by id and by title, searched by bisection
+
+Only the pages of the index and of the recipes read are loaded, the catalog is never parsed as a whole.
+
+Build a catalog from a TinyDB database :
+python catalog.py test.json test.catalog
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+from typing import Iterable
+
+from api import Ingredient, IngredientBatch, validate_recipe
+from search import IngredientsIndex, SearchIndex
+from storages import open_db
+
+MAGIC = b"PYSHCAT\0"
+FORMAT_VERSION = 1
+# magic, format version, count, offsets of keys, entries, by_id and by_title
+HEADER = struct.Struct("<8sIIQQQQ")
+ENTRY = struct.Struct("<QIQIQI")
+# Type of the positions in by_id and by_title
+POSITION = "I"
+INDEX_ITEM_SIZE = struct.calcsize(f"<{POSITION}")
+
+
+def build_catalog(recipes: Iterable[dict], path):
+    """Write the recipes ({"title", "ingredients", "id"}, ingredients as dicts or Ingredient) in a catalog file
+
+    The file is written next to path and renamed over it, so on POSIX systems the readers of the previous catalog
+    are not disturbed. Windows can't replace a file mapped in memory : the CatalogRecipesManager opened on path must
+    be closed first, else PermissionError is raised. Return the number of recipes.
+    """
+    temp_path = f"{path}.tmp"
+    keys = bytearray()
+    entries = []
+    ids = []
+    titles = []
+    with open(temp_path, "wb") as f:
+        f.write(bytes(HEADER.size))
+        for position, recipe in enumerate(recipes):
+            title, ingredients = validate_recipe(recipe)
+            id = str(recipe.get("id", position + 1))
+            record = json.dumps({"title": title, "ingredients": [ingredient.to_dict() for ingredient in ingredients],
+                                 "id": id}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            ids.append(id.encode("utf-8"))
+            titles.append(title.encode("utf-8"))
+            entries.append(ENTRY.pack(len(keys), len(ids[-1]), len(keys) + len(ids[-1]), len(titles[-1]),
+                                      f.tell(), len(record)))
+            keys += ids[-1] + titles[-1]
+            f.write(record)
+
+        keys_offset = f.tell()
+        f.write(keys)
+        entries_offset = f.tell()
+        f.write(b"".join(entries))
+        # Keys are compared as UTF-8 bytes, which is also the order of the code points
+        by_id_offset = f.tell()
+        f.write(struct.pack(f"<{len(ids)}{POSITION}", *sorted(range(len(ids)), key=ids.__getitem__)))
+        by_title_offset = f.tell()
+        f.write(struct.pack(f"<{len(titles)}{POSITION}", *sorted(range(len(titles)), key=titles.__getitem__)))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), keys_offset, entries_offset, by_id_offset,
+                            by_title_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(temp_path, path)
+    except OSError:
+        os.remove(temp_path)
+        raise
+    return len(entries)
+
+
+def build_catalog_from_tinydb(db_path, catalog_path, storage_format: str = "json"):
+    """Write the recipes table of a TinyDB database in a catalog file, return the number of recipes"""
+    db = open_db(db_path, storage_format=storage_format)
+    try:
+        return build_catalog(db.table("recipes"), catalog_path)
+    finally:
+        db.close()
+
+
+class CatalogRecipesManager:
+    """Read-only recipes manager on a catalog file built by build_catalog, with the read API of RecipesManager
+
+    Recipes are found by bisection in the memory-mapped index and decoded when they are asked for, so the
+    memory used doesn't depend on the size of the catalog. The write methods raise io.UnsupportedOperation,
+    the catalog must be rebuilt to change the recipes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # The mapping stays valid when the file is closed, and on POSIX systems when it is replaced by a new
+            # catalog (Windows refuses to replace it, see build_catalog)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a recipes catalog")
+        (_, version, self._count, self._keys_offset, self._entries_offset, self._by_id_offset,
+         self._by_title_offset) = HEADER.unpack_from(self._map)
+        if version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"Unsupported catalog version {version} in {path}")
+        # Lookups jump across the file, reading ahead would load pages that are not used
+        if hasattr(mmap, "MADV_RANDOM"):
+            self._map.madvise(mmap.MADV_RANDOM)
+        # Built by the first search, the catalog never changes
+        self._search_index = None
+        self._ingredients_index = None
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+    def _entry(self, position: int):
+        return ENTRY.unpack_from(self._map, self._entries_offset + position * ENTRY.size)
+
+    def _key(self, offset: int, length: int):
+        start = self._keys_offset + offset
+        return self._map[start:start + length]
+
+    def _find(self, index_offset: int, field: int, key: str):
+        """Return the position of the recipe whose id (field 0) or title (field 2) is key, None if there is none"""
+        key = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            position = struct.unpack_from(f"<{POSITION}", self._map, index_offset + middle * INDEX_ITEM_SIZE)[0]
+            entry = self._entry(position)
+            found = self._key(entry[field], entry[field + 1])
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return position
+        return None
+
+    def _read(self, position: int):
+        """Return the recipe at position as stored, ingredients as dicts"""
+        entry = self._entry(position)
+        return json.loads(self._map[entry[4]:entry[4] + entry[5]])
+
+    @staticmethod
+    def _recipe_decoder(recipe: dict):
+        return {**recipe, "ingredients": [Ingredient.from_json(ingredient) for ingredient in recipe["ingredients"]]}
+
+    def _read_by_ids(self, ids):
+        """Yield the recipes (as stored) of the ids found in the catalog"""
+        for id in dict.fromkeys(ids):
+            position = self._find(self._by_id_offset, 0, str(id))
+            if position is not None:
+                yield self._read(position)
+
+    def _get_search_index(self):
+        """Return the search index, build it by reading all the recipes once"""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            for position in range(self._count):
+                recipe = self._read(position)
+                self._search_index.add(recipe["id"], recipe["title"],
+                                       [ingredient["name"] for ingredient in recipe["ingredients"]])
+        return self._search_index
+
+    def _get_ingredients_index(self):
+        """Return the ingredients index, build it by reading all the recipes once"""
+        if self._ingredients_index is None:
+            self._ingredients_index = IngredientsIndex()
+            for position in range(self._count):
+                recipe = self._read(position)
+                self._ingredients_index.add(recipe["id"], [ingredient["name"] for ingredient in recipe["ingredients"]])
+        return self._ingredients_index
+
+    def _get_titles(self, ids):
+        """Return the {"id", "title"} of the recipes of ids found in the catalog, in the order of ids"""
+        titles = []
+        for id in ids:
+            position = self._find(self._by_id_offset, 0, str(id))
+            if position is not None:
+                entry = self._entry(position)
+                titles.append({"id": id, "title": self._key(entry[2], entry[3]).decode("utf-8")})
+        return titles
+
+    @staticmethod
+    def _read_only(*args, **kwargs):
+        raise io.UnsupportedOperation("The recipes catalog is read-only, rebuild it with build_catalog")
+
+    add_recipe = add_recipes = import_recipes = _read_only
+    update_recipe_by_title = delete_recipe_by_title = delete_recipe_by_id = _read_only
+
+    def get_version(self):
+        """Return the version of the recipes, constant since the catalog is read-only"""
+        return 0
+
+    # READ
+    def get_recipe_by_id(self, id):
+        position = self._find(self._by_id_offset, 0, str(id))
+        if position is None:
+            return None
+        return self._recipe_decoder(self._read(position))
+
+    def get_recipe_by_title(self, title: str):
+        """Get a recipe from the catalog by title"""
+        position = self._find(self._by_title_offset, 2, title)
+        if position is None:
+            return None
+        return self._recipe_decoder(self._read(position))
+
+    def get_recipes_by_ids(self, ids):
+        """Get several recipes from the catalog, return a dict indexed by id"""
+        return {recipe["id"]: self._recipe_decoder(recipe) for recipe in self._read_by_ids(ids)}
+
+    def get_ingredients_by_ids(self, ids):
+        """Get the ingredients of several recipes, return a dict of IngredientBatch indexed by id"""
+        return {recipe["id"]: IngredientBatch.from_json(recipe["ingredients"]) for recipe in self._read_by_ids(ids)}
+
+    def get_all_recipes(self):
+        """Get all the recipes of the catalog"""
+        return [self._recipe_decoder(self._read(position)) for position in range(self._count)]
+
+    def get_all_titles(self):
+        """Get the {"id", "title"} of all the recipes from the index, without decoding the recipes"""
+        titles = []
+        for position in range(self._count):
+            id_offset, id_length, title_offset, title_length, _, _ = self._entry(position)
+            titles.append({"id": self._key(id_offset, id_length).decode("utf-8"),
+                           "title": self._key(title_offset, title_length).decode("utf-8")})
+        return titles
+
+    def search(self, query: str, limit: int = None):
+        """Search recipes by words of their title and ingredients names, see RecipesManager.search"""
+        return self._get_titles(self._get_search_index().search(query, limit=limit))
+
+    def get_recipes_by_ingredients(self, names: Iterable[str], match_all: bool = True):
+        """Get the {"id", "title"} of the recipes using all the ingredients, see RecipesManager"""
+        ingredients_index = self._get_ingredients_index()
+        ids = ingredients_index.with_all(names) if match_all else ingredients_index.with_any(names)
+        return self._get_titles(sorted(ids, key=int))
+
+    def rank_by_pantry(self, pantry: Iterable[str], limit: int = None, min_coverage: float = 0.0):
+        """Rank the recipes by the part of their ingredients found in pantry, see RecipesManager.rank_by_pantry"""
+        ranked = self._get_ingredients_index().coverage(pantry, limit=limit, min_coverage=min_coverage)
+        return [{**titles, "coverage": coverage.coverage, "missing": coverage.missing}
+                for titles, coverage in zip(self._get_titles(coverage.id for coverage in ranked), ranked)]
+
+    def print_recipes(self):
+        """Return a string with recipes for print"""
+        return "".join(f"{titles['id']} => {titles['title']}\n" for titles in self.get_all_titles())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build a read-only recipes catalog from a PyShopping TinyDB database")
+    parser.add_argument("db_path")
+    parser.add_argument("catalog_path")
+    parser.add_argument("--format", dest="storage_format", default="json")
+    args = parser.parse_args()
+
+    count = build_catalog_from_tinydb(args.db_path, args.catalog_path, storage_format=args.storage_format)
+    print(f"{args.catalog_path} : {count} recettes")
@@ -0,0 +1,278 @@
+"""
+Non-interactive command line of PyShopping, the scriptable counterpart of the ConsoleApp menu
+
+python cli.py test.json recipes import recettes.csv
+python cli.py test.json recipes list --search pâtes
+python cli.py test.json list add "pâtes bolo" 2
+python cli.py test.json --list semaine list create
+python cli.py test.json --list semaine list generate --format csv > semaine.csv
+python cli.py test.json --stats batch commandes.txt
+python cli.py test.json bench
+
+All the commands of a run share one opening of the database, in write behind mode : it is written once, when it
+is closed. batch runs one command by line of a file (or of stdin, "-"), with the syntax of the command line after
+the database path, blank lines and lines starting with # are skipped. --stats prints the time spent by command on
+stderr. Outputs go to stdout, errors to stderr, the exit status is 1 if a command failed.
+"""
+import argparse
+import io
+import math
+import shlex
+import sys
+import time
+
+from api import ShoppingList, ShoppingLists
+from export import WRITERS
+from storages import FORMATS
+
+# Number of runs of each step of bench by default
+BENCH_REPEAT = 5
+
+
+class CommandError(Exception):
+    """Error of a command, reported without traceback"""
+
+
+class _Parser(argparse.ArgumentParser):
+    """ArgumentParser raising CommandError instead of exiting, so a wrong line of a batch doesn't end the process"""
+
+    def error(self, message):
+        raise CommandError(f"{self.prog} : {message}")
+
+
+def _add_commands(parser: argparse.ArgumentParser, batch: bool = True):
+    """Add the subcommands to parser, the batch command too if batch is True"""
+    commands = parser.add_subparsers(dest="command", metavar="command", parser_class=_Parser)
+    commands.required = True
+
+    recipes = commands.add_parser("recipes", help="recettes de la base de données")
+    recipes_commands = recipes.add_subparsers(dest="action", metavar="action", parser_class=_Parser)
+    recipes_commands.required = True
+    import_ = recipes_commands.add_parser("import", help="importer des recettes d'un fichier JSON ou CSV")
+    import_.add_argument("path", help='fichier, "-" pour stdin')
+    import_.add_argument("--format", choices=["json", "csv"],
+                         help="format du fichier, d'après son extension par défaut, json pour stdin")
+    list_recipes = recipes_commands.add_parser("list", help="afficher les recettes (id et titre)")
+    list_recipes.add_argument("--search", help="mots du titre ou des ingrédients")
+    list_recipes.add_argument("--limit", type=int)
+
+    list_ = commands.add_parser("list", help="liste de courses")
+    list_commands = list_.add_subparsers(dest="action", metavar="action", parser_class=_Parser)
+    list_commands.required = True
+    list_commands.add_parser("create", help="créer la liste de --list")
+    add = list_commands.add_parser("add", help="ajouter une recette à la liste")
+    add.add_argument("recipe", help="titre de la recette, ou son id avec --id")
+    add.add_argument("quantity", type=int, nargs="?", default=1)
+    add.add_argument("--id", action="store_true", help="recipe est l'id de la recette")
+    list_commands.add_parser("show", help="afficher les recettes de la liste")
+    list_commands.add_parser("clear", help="vider la liste")
+    generate = list_commands.add_parser("generate", help="générer la liste de courses")
+    generate.add_argument("--format", choices=list(WRITERS), default="text")
+    generate.add_argument("--output", default="-", help='fichier, "-" pour stdout')
+    generate.add_argument("--sort-by", choices=["name", "quantity"])
+    generate.add_argument("--group-by", choices=["unit", "initial"])
+    generate.add_argument("--subtract-pantry", action="store_true", help="retirer le stock du garde-manger")
+    generate.add_argument("--rebuild", action="store_true", help="recalculer les totaux depuis le début")
+
+    bench = commands.add_parser("bench", help="mesurer l'agrégation et l'export de la liste, sans l'écrire")
+    bench.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+
+    if batch:
+        batch_ = commands.add_parser("batch", help="exécuter les commandes d'un fichier, une par ligne")
+        batch_.add_argument("path", nargs="?", default="-", help='fichier, "-" pour stdin')
+
+
+def make_parser():
+    parser = _Parser(prog="cli.py", description="Commandes non interactives de PyShopping")
+    parser.add_argument("db_path")
+    parser.add_argument("--list", dest="list_name",
+                        help="nom d'une liste créée par list create (voir ShoppingLists), liste par défaut sinon")
+    parser.add_argument("--storage-format", choices=list(FORMATS), default="json")
+    parser.add_argument("--catalog", dest="catalog_path", help="catalogue de recettes en lecture seule")
+    parser.add_argument("--stats", action="store_true", help="afficher le temps passé par commande sur stderr")
+    _add_commands(parser)
+    return parser
+
+
+class BatchApp:
+    """Commands of ConsoleApp without prompts, on one opening of the database for all the commands of a run"""
+
+    def __init__(self, db_path, list_name: str = None, stdin=None, stdout=None, stderr=None, **options):
+        """stdin, stdout, stderr : streams of the commands, the ones of sys by default
+        options are passed to ShoppingList (storage_format, catalog_path...)"""
+        self.stdin = sys.stdin if stdin is None else stdin
+        self.stdout = sys.stdout if stdout is None else stdout
+        self.stderr = sys.stderr if stderr is None else stderr
+        # command -> [count, seconds]
+        self.stats = {}
+        start = time.perf_counter()
+        # Written once by close_db instead of by each command
+        options.update(write_behind=True, flush_every=math.inf, flush_interval=math.inf)
+        self.list_name = list_name
+        if list_name is None:
+            self._database = self._shopping_list = ShoppingList(db_path, **options)
+        else:
+            self._database = ShoppingLists(db_path, **options)
+            try:
+                # None until list create if the list doesn't exist
+                self._shopping_list = self._database.get(list_name, create=False)
+            except ValueError:
+                self._database.close_db()
+                raise
+        self.recipes_manager = self._database.recipes_manager
+        self._add_stat("open", time.perf_counter() - start)
+        # Set by the batch command, to tell the line of the command which failed
+        self.line = None
+
+    @property
+    def shopping_list(self):
+        if self._shopping_list is None:
+            raise CommandError(f"Liste inconnue : {self.list_name}, à créer avec list create")
+        return self._shopping_list
+
+    def _add_stat(self, name: str, seconds: float):
+        stat = self.stats.setdefault(name, [0, 0.0])
+        stat[0] += 1
+        stat[1] += seconds
+
+    def close_db(self):
+        start = time.perf_counter()
+        self._database.close_db()
+        self._add_stat("close", time.perf_counter() - start)
+
+    def print_stats(self, file):
+        """Write the time spent by command in file"""
+        total = sum(seconds for _, seconds in self.stats.values())
+        print(f"{'commande':<18} {'nombre':>7} {'total (ms)':>11} {'moyenne (ms)':>13}", file=file)
+        for name, (count, seconds) in self.stats.items():
+            print(f"{name:<18} {count:>7} {seconds * 1e3:>11.1f} {seconds / count * 1e3:>13.2f}", file=file)
+        print(f"{'total':<18} {'':>7} {total * 1e3:>11.1f}", file=file)
+
+    def execute(self, args: argparse.Namespace):
+        """Execute the command parsed in args and count its time"""
+        name = args.command if args.command in ("bench", "batch") else f"{args.command} {args.action}"
+        method = getattr(self, name.replace(" ", "_"))
+        start = time.perf_counter()
+        try:
+            method(args)
+        finally:
+            # The time of a batch is the one of its commands, already counted
+            if args.command != "batch":
+                self._add_stat(name, time.perf_counter() - start)
+
+    def _print(self, *values):
+        print(*values, sep="\t", file=self.stdout)
+
+    # RECIPES
+    def recipes_import(self, args):
+        if args.path == "-":
+            report = self.recipes_manager.import_recipes(self.stdin, format=args.format or "json")
+        else:
+            report = self.recipes_manager.import_recipes(args.path, format=args.format)
+        print(f"{report.count} recettes importées en {report.seconds:.2f} s", file=self.stderr)
+
+    def recipes_list(self, args):
+        if args.search is not None:
+            recipes = self.recipes_manager.search(args.search, limit=args.limit)
+        else:
+            recipes = self.recipes_manager.get_all_titles()[:args.limit]
+        for recipe in recipes:
+            self._print(recipe["id"], recipe["title"])
+
+    # SHOPPING LIST
+    def list_create(self, args):
+        if self.list_name is None:
+            raise CommandError("list create : le nom de la liste est donné par --list")
+        self._shopping_list = self._database.get(self.list_name)
+
+    def list_add(self, args):
+        if args.id:
+            added = self.shopping_list.add_recipe_by_id(args.recipe, args.quantity)
+        else:
+            added = self.shopping_list.add_recipe_by_title(args.recipe, args.quantity)
+        if not added:
+            raise CommandError(f"Recette inconnue : {args.recipe}")
+
+    def list_show(self, args):
+        for entry in self.shopping_list.get_all_recipes():
+            self._print(entry["id"], entry["quantity"], entry["recipe"]["title"])
+
+    def list_clear(self, args):
+        self.shopping_list.clear()
+
+    def list_generate(self, args):
+        self.shopping_list.generate(rebuild=args.rebuild, subtract_pantry=args.subtract_pantry)
+        self.shopping_list.export(self.stdout if args.output == "-" else args.output, format=args.format,
+                                  sort_by=args.sort_by, group_by=args.group_by,
+                                  subtract_pantry=args.subtract_pantry)
+
+    # BENCH
+    def bench(self, args):
+        """Time the aggregation of the list from scratch and its export in each format, nothing is written"""
+        steps = {"aggregate": self.shopping_list.check_totals}
+        for format in WRITERS:
+            steps[f"export {format}"] = lambda format=format: self.shopping_list.export(io.StringIO(), format=format)
+        entries = len(self.shopping_list.recipes_list)
+        self._print(f"{entries} recettes dans la liste, {args.repeat} mesures")
+        self._print(f"{'étape':<16} {'min (ms)':>9} {'moyenne (ms)':>13}")
+        for name, step in steps.items():
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                step()
+                times.append(time.perf_counter() - start)
+            self._print(f"{name:<16} {min(times) * 1e3:>9.2f} {sum(times) / len(times) * 1e3:>13.2f}")
+
+    # BATCH
+    def batch(self, args):
+        """Execute the commands of a file, one by line, stop at the first error"""
+        parser = _Parser(prog="batch")
+        _add_commands(parser, batch=False)
+        f = self.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        try:
+            for self.line, text in enumerate(f, start=1):
+                text = text.strip()
+                if not text or text.startswith("#"):
+                    continue
+                try:
+                    command = parser.parse_args(shlex.split(text))
+                except ValueError as e:
+                    # Unbalanced quotes
+                    raise CommandError(str(e))
+                self.execute(command)
+            self.line = None
+        finally:
+            if f is not self.stdin:
+                f.close()
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    """Run the command line argv (sys.argv[1:] by default), return the exit status"""
+    stderr = sys.stderr if stderr is None else stderr
+    try:
+        args = make_parser().parse_args(argv)
+    except CommandError as e:
+        print(e, file=stderr)
+        return 2
+
+    app = None
+    status = 0
+    try:
+        app = BatchApp(args.db_path, list_name=args.list_name, stdin=stdin, stdout=stdout, stderr=stderr,
+                       storage_format=args.storage_format, catalog_path=args.catalog_path)
+        app.execute(args)
+    except (CommandError, ValueError, KeyError, OSError) as e:
+        line = "" if app is None or app.line is None else f"ligne {app.line} : "
+        print(f"Erreur : {line}{e}", file=stderr)
+        status = 1
+    finally:
+        # The commands executed before an error are kept
+        if app is not None:
+            app.close_db()
+    if args.stats and app is not None:
+        app.print_stats(stderr)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
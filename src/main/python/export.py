@@ -0,0 +1,106 @@
+"""
+Streaming export of shopping lists in text, CSV, JSON Lines or Markdown
+"""
+import csv
+import json
+from itertools import groupby
+from typing import Iterable, NamedTuple
+
+
+class Row(NamedTuple):
+    """Row of a shopping list"""
+    name: str
+    quantity: object
+    unit: str
+    group: str = None
+
+
+SORT_KEYS = {
+    "name": lambda row: row.name,
+    "quantity": lambda row: (row.unit, -row.quantity),
+}
+
+GROUP_KEYS = {
+    "unit": lambda row: row.unit,
+    "initial": lambda row: row.name[:1].upper(),
+}
+
+
+def iter_rows(totals: Iterable, sort_by: str = None, group_by: str = None):
+    """Yield the Rows of totals ({(name, unit): quantity} or iterable of (name, unit, quantity))
+
+    Without sort_by and group_by the rows are streamed, else they are sorted in memory
+    """
+    if isinstance(totals, dict):
+        rows = (Row(name, quantity, unit) for (name, unit), quantity in totals.items())
+    else:
+        rows = (Row(name, quantity, unit) for name, unit, quantity in totals)
+    if sort_by is not None:
+        rows = sorted(rows, key=SORT_KEYS[sort_by])
+    if group_by is not None:
+        group_key = GROUP_KEYS[group_by]
+        # sorted is stable, the rows keep the sort_by order in their group
+        rows = (row._replace(group=group_key(row)) for row in sorted(rows, key=group_key))
+    return rows
+
+
+def write_text(rows: Iterable[Row], file):
+    """Write rows like "name => quantity unit", with a line for each group"""
+    for group, group_rows in groupby(rows, key=lambda row: row.group):
+        if group is not None:
+            file.write(f"[{group}]\n")
+        for row in group_rows:
+            file.write(f"{row.name} => {row.quantity} {row.unit}\n")
+
+
+def write_csv(rows: Iterable[Row], file):
+    writer = csv.writer(file)
+    writer.writerow(["name", "quantity", "unit", "group"])
+    for row in rows:
+        writer.writerow([row.name, row.quantity, row.unit, "" if row.group is None else row.group])
+
+
+def write_jsonl(rows: Iterable[Row], file):
+    for row in rows:
+        file.write(json.dumps(row._asdict(), ensure_ascii=False))
+        file.write("\n")
+
+
+def write_markdown(rows: Iterable[Row], file):
+    """Write a checklist, with a title for each group"""
+    for i, (group, group_rows) in enumerate(groupby(rows, key=lambda row: row.group)):
+        if group is not None:
+            if i > 0:
+                file.write("\n")
+            file.write(f"## {group}\n\n")
+        for row in group_rows:
+            file.write(f"- [ ] {row.name} : {row.quantity} {row.unit}\n")
+
+
+WRITERS = {
+    "text": write_text,
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "markdown": write_markdown,
+}
+
+# File extension -> format
+EXTENSIONS = {
+    ".txt": "text",
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".md": "markdown",
+}
+
+
+def export(rows: Iterable[Row], file, format: str = "text"):
+    """Write rows in file (a path or a file-like object) in the given format"""
+    try:
+        writer = WRITERS[format]
+    except KeyError:
+        raise ValueError(f"format must be one of {list(WRITERS)}, got {format!r}")
+    if hasattr(file, "write"):
+        writer(rows, file)
+    else:
+        with open(file, "w", newline="" if format == "csv" else None, encoding="utf-8") as f:
+            writer(rows, f)
@@ -0,0 +1,125 @@
+import itertools
+import logging
+import threading
+
+from PySide2 import QtCore
+
+LOGGER = logging.getLogger(__file__)
+LOGGER.setLevel(logging.DEBUG)
+
+
+class _Worker(QtCore.QObject):
+    """Object living in the database thread, execute the tasks in the order they are submitted"""
+    sig_finished = QtCore.Signal(int, object)
+    sig_failed = QtCore.Signal(int, str)
+
+    def __init__(self):
+        super().__init__()
+
+        # Ids of the tasks cancelled before being executed, shared with the GUI thread
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def cancel(self, task_id):
+        with self._lock:
+            self._cancelled.add(task_id)
+
+    @QtCore.Slot(int, object, object, object)
+    def run(self, task_id, function, args, kwargs):
+        with self._lock:
+            if task_id in self._cancelled:
+                self._cancelled.discard(task_id)
+                return
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            LOGGER.exception(f"Task {task_id} failed")
+            self.sig_failed.emit(task_id, str(e))
+        else:
+            self.sig_finished.emit(task_id, result)
+
+
+class DbWorker(QtCore.QObject):
+    """Execute the RecipesManager / ShoppingList calls in a background thread
+
+    Tasks are executed one after the other in the order they are submitted, so the database is only used by
+    one thread. Results come back to the GUI thread through queued signals and are passed to the callbacks.
+    """
+    # Emit True when the first task is submitted, False when there is no more pending task
+    sig_busy_changed = QtCore.Signal(bool)
+    # Emit the message of a task without on_error callback that raised an exception
+    sig_error = QtCore.Signal(str)
+    # Internal signal used to send the tasks to the worker thread
+    _sig_run = QtCore.Signal(int, object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self._task_ids = itertools.count(1)
+        # task id -> (on_result, on_error) of the pending tasks
+        self._callbacks = {}
+
+        self.thread = QtCore.QThread(self)
+        self._worker = _Worker()
+        self._worker.moveToThread(self.thread)
+
+        # Both connections are queued since the objects live in different threads
+        self._sig_run.connect(self._worker.run)
+        self._worker.sig_finished.connect(self.on_task_finished)
+        self._worker.sig_failed.connect(self.on_task_failed)
+
+        self.thread.start()
+
+    def is_busy(self):
+        return bool(self._callbacks)
+
+    def submit(self, function, *args, on_result=None, on_error=None, **kwargs):
+        """Execute function(*args, **kwargs) in the database thread, return the id of the task
+
+        on_result(result) and on_error(message) are called in the GUI thread
+        """
+        task_id = next(self._task_ids)
+        self._callbacks[task_id] = (on_result, on_error)
+        if len(self._callbacks) == 1:
+            self.sig_busy_changed.emit(True)
+        self._sig_run.emit(task_id, function, args, kwargs)
+        return task_id
+
+    def cancel(self, task_id):
+        """Cancel a task : it is skipped if it has not started yet, else its result is ignored"""
+        if self._callbacks.pop(task_id, None) is None:
+            return
+        self._worker.cancel(task_id)
+        if not self._callbacks:
+            self.sig_busy_changed.emit(False)
+
+    def stop(self, last_task=None):
+        """Execute last_task (e.g. close the database) after the pending tasks and stop the thread"""
+        if last_task is not None:
+            self._sig_run.emit(0, last_task, (), {})
+        # Executed in the database thread, so its event loop stops after the pending tasks
+        self._sig_run.emit(0, lambda: QtCore.QThread.currentThread().quit(), (), {})
+        self.thread.wait()
+        self._callbacks.clear()
+
+    def _pop_callbacks(self, task_id):
+        callbacks = self._callbacks.pop(task_id, None)
+        if callbacks is not None and not self._callbacks:
+            self.sig_busy_changed.emit(False)
+        return callbacks
+
+    @QtCore.Slot(int, object)
+    def on_task_finished(self, task_id, result):
+        callbacks = self._pop_callbacks(task_id)
+        if callbacks is not None and callbacks[0] is not None:
+            callbacks[0](result)
+
+    @QtCore.Slot(int, str)
+    def on_task_failed(self, task_id, message):
+        callbacks = self._pop_callbacks(task_id)
+        if callbacks is None:
+            return
+        if callbacks[1] is not None:
+            callbacks[1](message)
+        else:
+            self.sig_error.emit(message)
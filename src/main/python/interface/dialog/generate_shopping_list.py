@@ -1,23 +1,27 @@
+import io
 import logging
+import os
 
 from PySide2 import QtWidgets
 
-from constants import TEMP_SHOPPING_LIST_PATH, USER_DIR
+from constants import USER_DIR
+from export import EXTENSIONS, export
 
 LOGGER = logging.getLogger(__file__)
 LOGGER.setLevel(logging.DEBUG)
 
 
 class GenerateShoppingListDialog(QtWidgets.QDialog):
+    # Filters of the save dialog, the format is chosen from the file extension
+    SAVE_FILTERS = 'Fichiers texte (*.txt);;CSV (*.csv);;JSON Lines (*.jsonl);;Markdown (*.md)'
 
-    def __init__(self):
+    def __init__(self, rows):
         super().__init__()
 
         self.setWindowTitle(f"Liste de courses")
 
-        self.temp_file_path = TEMP_SHOPPING_LIST_PATH
-
-        self.read_temp_file()
+        # Rows (export.Row) of the generated shopping list
+        self.rows = list(rows)
 
         self.setup_ui()
 
@@ -51,7 +55,7 @@ class GenerateShoppingListDialog(QtWidgets.QDialog):
         LOGGER.debug("modify_widgets()")
 
         self.te_shopping_list.setReadOnly(True)
-        self.te_shopping_list.setPlainText(self.temp_file_content)
+        self.te_shopping_list.setPlainText(self.render_text())
 
     def add_widgets_to_layouts(self):
         LOGGER.debug("add_widgets_to_layouts()")
@@ -82,47 +86,39 @@ class GenerateShoppingListDialog(QtWidgets.QDialog):
         if save_path:
             self.write_in_file(save_path)
 
-        self.delete_temp_file()
-
         super().accept()
 
     def reject(self):
         LOGGER.debug("btn_cancel clicked")
 
-        self.delete_temp_file()
-
         super().reject()
 
     # END SETUP_UI
 
     # FILES MANAGEMENT
-    def read_temp_file(self):
-        """Method to read temp file and initialize self.temp_file_content with content"""
-        with open(self.temp_file_path, 'r') as file:
-            self.temp_file_content = file.read()
-
-    @staticmethod
-    def delete_temp_file():
-        """Method to delete temp file"""
-        TEMP_SHOPPING_LIST_PATH.unlink()
+    def render_text(self):
+        """Method to render the rows of the shopping list as text"""
+        buffer = io.StringIO()
+        export(self.rows, buffer)
+        return buffer.getvalue()
 
     def ask_user_save_path(self):
-        """Method to open a FileDialog to save temp content in"""
+        """Method to open a FileDialog to save the shopping list in"""
         file_dialog = QtWidgets.QFileDialog()
         file_dialog.setDirectory(str(USER_DIR))
         file_path, _ = file_dialog.getSaveFileName(parent=self,
                                                    caption='Enregistrer la liste de courses',
-                                                   filter='Fichiers texte (*.txt)')
+                                                   filter=self.SAVE_FILTERS)
         return file_path
 
     def write_in_file(self, file_path):
-        """Method to write temp content in file"""
-        with open(file_path, "w") as f:
-            f.write(self.temp_file_content)
+        """Method to stream the rows of the shopping list in file, in the format of its extension"""
+        extension = os.path.splitext(file_path)[1].lower()
+        export(self.rows, file_path, format=EXTENSIONS.get(extension, "text"))
 
 
 if __name__ == '__main__':
     app = QtWidgets.QApplication()
-    win = GenerateShoppingListDialog()
+    win = GenerateShoppingListDialog([])
     win.show()
     app.exec_()
\ No newline at end of file
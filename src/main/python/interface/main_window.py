@@ -1,26 +1,42 @@
 from PySide2 import QtWidgets, QtCore
 import logging
 
-from constants import DB_PATH, TEMP_SHOPPING_LIST_PATH
-from api import ShoppingList, RecipesManager
+from constants import DB_PATH
 
-from .custom_widgets import CustomListWidget
-from .dialog import AddRecipeToDbDialog, AddToShoppingListDialog, GenerateShoppingListDialog
+from .db_worker import DbWorker
+from .recipes_model import RecipesListModel
 
 
 LOGGER = logging.getLogger(__file__)
 LOGGER.setLevel(logging.DEBUG)
 
 
+def open_shopping_list(db_path):
+    """Open the shopping list, executed in the database thread with the import of the API and its dependencies"""
+    from api import ShoppingList
+    return ShoppingList(db_path, write_behind=True)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     # Signal emit when database change
     sig_db_changed = QtCore.Signal()
 
+    # Maximum number of recipes shown for a search
+    SEARCH_LIMIT = 200
+
     def __init__(self):
         super().__init__()
 
+        # Database calls are executed in a background thread, the database is available after on_db_loaded
+        self.db_worker = DbWorker(self)
+        self.shopping_list = None
+        self.recipes_manager = None
+        # Id of the running generation task, None if there is none
+        self.generate_task_id = None
+
         self.setup_ui()
-        self.load_db()
+        # The database is loaded when the event loop starts, so the window is painted first
+        QtCore.QTimer.singleShot(0, self.load_db)
 
     def setup_ui(self):
         LOGGER.debug("setup_ui()")
@@ -39,11 +55,20 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Recipes from database
         self.lbl_recipes_from_db = QtWidgets.QLabel("Recettes de la base de donnée")
-        self.lw_recipes_from_db = CustomListWidget()
+        self.le_search = QtWidgets.QLineEdit()
+        self.search_timer = QtCore.QTimer(self)
+        self.recipes_from_db_model = RecipesListModel(key=lambda recipe: recipe["id"],
+                                                      display=lambda recipe: recipe["title"],
+                                                      parent=self)
+        self.lv_recipes_from_db = QtWidgets.QListView()
 
         # Recipes from shopping list
         self.lbl_recipes_from_shopping_list = QtWidgets.QLabel("Recettes de la liste de courses")
-        self.lw_recipes_from_shopping_list = CustomListWidget()
+        self.recipes_from_shopping_list_model = RecipesListModel(
+            key=lambda recipe: recipe["id"],
+            display=lambda recipe: f"{recipe['recipe']['title']} ({recipe['quantity']} parts)",
+            parent=self)
+        self.lv_recipes_from_shopping_list = QtWidgets.QListView()
 
         # Buttons
         self.btn_add_to_db = QtWidgets.QPushButton("Créer une recette")
@@ -51,6 +76,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_delete_from_shopping_list = QtWidgets.QPushButton("Supprimer de la liste de courses")
         self.btn_generate_shopping_list = QtWidgets.QPushButton("Générer la liste de courses")
 
+        # Timer used to write the pending database changes on the disk
+        self.flush_timer = QtCore.QTimer(self)
+
+        # Busy indicator, shown when a database task takes some time
+        self.pb_busy = QtWidgets.QProgressBar()
+        self.btn_cancel_generate = QtWidgets.QPushButton("Annuler")
+        self.busy_timer = QtCore.QTimer(self)
+
     def create_layout(self):
         LOGGER.debug("create_layout()")
 
@@ -62,10 +95,38 @@ class MainWindow(QtWidgets.QMainWindow):
     def modify_widgets(self):
         LOGGER.debug("modify_widgets()")
 
+        # Lists views, all the rows have the same height so the view doesn't measure each one
+        for list_view, model in ((self.lv_recipes_from_db, self.recipes_from_db_model),
+                                 (self.lv_recipes_from_shopping_list, self.recipes_from_shopping_list_model)):
+            list_view.setModel(model)
+            list_view.setUniformItemSizes(True)
+            list_view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+
+        # Search, executed when the user stops typing for 250 ms
+        self.le_search.setPlaceholderText("Rechercher une recette ou un ingrédient...")
+        self.le_search.setClearButtonEnabled(True)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+
         # Disable btn_add_to_shopping_list and btn generate_shopping_list initially
         self.btn_add_to_shopping_list.setEnabled(False)
         self.btn_generate_shopping_list.setEnabled(False)
 
+        # Disable btn_add_to_db and the search until the database is loaded
+        self.btn_add_to_db.setEnabled(False)
+        self.le_search.setEnabled(False)
+
+        # Check every second if database changes must be written
+        self.flush_timer.setInterval(1000)
+
+        # Busy indicator : progress bar without range, shown after 200 ms so short tasks don't blink
+        self.pb_busy.setRange(0, 0)
+        self.pb_busy.setMaximumWidth(150)
+        self.pb_busy.setVisible(False)
+        self.btn_cancel_generate.setVisible(False)
+        self.busy_timer.setSingleShot(True)
+        self.busy_timer.setInterval(200)
+
     def add_widgets_to_layouts(self):
         LOGGER.debug("add_widgets_to_layouts()")
 
@@ -74,11 +135,12 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Recipes from database
         self.layout.addWidget(self.lbl_recipes_from_db, 1, 0, 1, 2)
-        self.layout.addWidget(self.lw_recipes_from_db, 2, 0, 8, 2)
+        self.layout.addWidget(self.le_search, 2, 0, 1, 2)
+        self.layout.addWidget(self.lv_recipes_from_db, 3, 0, 7, 2)
 
         # Recipes from shopping list
         self.layout.addWidget(self.lbl_recipes_from_shopping_list, 1, 2, 1, 2)
-        self.layout.addWidget(self.lw_recipes_from_shopping_list, 2, 2, 8, 2)
+        self.layout.addWidget(self.lv_recipes_from_shopping_list, 2, 2, 8, 2)
 
         # Buttons
         self.layout.addWidget(self.btn_add_to_db, 10, 0)
@@ -86,6 +148,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.layout.addWidget(self.btn_delete_from_shopping_list, 10, 2)
         self.layout.addWidget(self.btn_generate_shopping_list, 10, 3)
 
+        # Busy indicator
+        self.statusBar().addPermanentWidget(self.pb_busy)
+        self.statusBar().addPermanentWidget(self.btn_cancel_generate)
+
     def setup_connections(self):
         LOGGER.debug("setup_connections()")
 
@@ -94,13 +160,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_add_to_shopping_list.clicked.connect(self.on_btn_add_to_shopping_list)
         self.btn_delete_from_shopping_list.clicked.connect(self.on_btn_delete_from_shopping_list)
         self.btn_generate_shopping_list.clicked.connect(self.on_btn_generate_shopping_list)
+        self.btn_cancel_generate.clicked.connect(self.on_btn_cancel_generate)
 
-        # ListWidgets changed
-        self.lw_recipes_from_db.count_changed.connect(self.check_db_list)
-        self.lw_recipes_from_shopping_list.count_changed.connect(self.check_shopping_list)
+        # Search
+        self.le_search.textChanged.connect(self.search_timer.start)
+        self.search_timer.timeout.connect(self.update_lists_widgets)
+
+        # Lists changed, once by refresh
+        self.recipes_from_db_model.count_changed.connect(self.check_db_list)
+        self.recipes_from_shopping_list_model.count_changed.connect(self.check_shopping_list)
 
         # Others events
         self.sig_db_changed.connect(self.update_lists_widgets)
+        self.flush_timer.timeout.connect(self.on_flush_timer_timeout)
+        self.busy_timer.timeout.connect(self.on_busy_timer_timeout)
+        self.db_worker.sig_busy_changed.connect(self.on_db_busy_changed)
+        self.db_worker.sig_error.connect(self.on_db_error)
         self.closeEvent = self.on_close_event
 
     # END SETUP_UI
@@ -108,81 +183,155 @@ class MainWindow(QtWidgets.QMainWindow):
     # LOAD_DB
 
     def load_db(self):
-        """Method to load database"""
+        """Method to load database in the database thread"""
         LOGGER.debug("load_db()")
 
-        self.shopping_list = ShoppingList(DB_PATH)
-        self.recipes_manager: RecipesManager = self.shopping_list.recipes_manager
+        self.statusBar().showMessage("Chargement de la base de donnée...")
+        self.db_worker.submit(open_shopping_list, DB_PATH, on_result=self.on_db_loaded)
+
+    def on_db_loaded(self, shopping_list):
+        LOGGER.debug("Database loaded")
+
+        self.shopping_list = shopping_list
+        self.recipes_manager = self.shopping_list.recipes_manager
+        self.statusBar().clearMessage()
+        self.btn_add_to_db.setEnabled(True)
+        self.le_search.setEnabled(True)
+        self.flush_timer.start()
         self.sig_db_changed.emit()
 
+    # DATABASE TASKS, executed in the database thread
+
+    def read_lists(self, query: str = ""):
+        """Return the titles of the recipes of the database matching query (all if empty)
+        and the entries of the shopping list"""
+        if query.strip():
+            recipes = self.recipes_manager.search(query, limit=self.SEARCH_LIMIT)
+        else:
+            recipes = self.recipes_manager.get_all_titles()
+        return recipes, self.shopping_list.get_all_recipes()
+
+    def generate_rows(self):
+        """Generate the shopping list and return its rows"""
+        self.shopping_list.generate()
+        return list(self.shopping_list.iter_rows())
+
     # SLOTS
     def on_btn_add_to_db(self):
         LOGGER.debug("btn_add_to_db clicked")
 
+        from .dialog.add_recipe_to_db import AddRecipeToDbDialog
         dialog = AddRecipeToDbDialog()
         result = dialog.exec_()
         if result == QtWidgets.QDialog.Accepted:
             title = dialog.title
             ingredients = dialog.ingredients
             LOGGER.debug(f"{title} => {ingredients}")
-            self.recipes_manager.add_recipe(title=title, ingredients=ingredients)
-            self.sig_db_changed.emit()
+            self.db_worker.submit(self.recipes_manager.add_recipe, title=title, ingredients=ingredients,
+                                  on_result=lambda _: self.sig_db_changed.emit())
 
     def on_btn_add_to_shopping_list(self):
         LOGGER.debug("btn_add_to_shopping_list clicked")
 
-        selected_item = self.lw_recipes_from_db.currentItem()
-        if selected_item:
-            recipe = selected_item.recipe
+        recipe = self.recipes_from_db_model.item(self.lv_recipes_from_db.currentIndex().row())
+        if recipe:
+            from .dialog.add_to_shopping_list import AddToShoppingListDialog
             dialog = AddToShoppingListDialog(recipe["title"])
             result = dialog.exec_()
             if result == QtWidgets.QDialog.Accepted:
                 quantity = dialog.quantity
-                self.shopping_list.add_recipe_by_id(id=recipe["id"], quantity=quantity)
-                self.sig_db_changed.emit()
+                self.db_worker.submit(self.shopping_list.add_recipe_by_id, id=recipe["id"], quantity=quantity,
+                                      on_result=lambda _: self.sig_db_changed.emit())
 
     def on_btn_delete_from_shopping_list(self):
         LOGGER.debug("btn_delete_from_shopping_list clicked")
 
-        selected_item = self.lw_recipes_from_shopping_list.currentItem()
-        if selected_item:
-            recipe = selected_item.recipe
-            self.shopping_list.delete_recipe_by_id(recipe["id"])
-            self.sig_db_changed.emit()
+        recipe = self.recipes_from_shopping_list_model.item(self.lv_recipes_from_shopping_list.currentIndex().row())
+        if recipe:
+            self.db_worker.submit(self.shopping_list.delete_recipe_by_id, recipe["id"],
+                                  on_result=lambda _: self.sig_db_changed.emit())
 
     def on_btn_generate_shopping_list(self):
         LOGGER.debug("btn_generate_shopping_list clicked")
 
-        self.shopping_list.generate(TEMP_SHOPPING_LIST_PATH)
-        dialog = GenerateShoppingListDialog()
+        self.btn_generate_shopping_list.setEnabled(False)
+        self.btn_cancel_generate.setVisible(True)
+        self.generate_task_id = self.db_worker.submit(self.generate_rows,
+                                                      on_result=self.on_shopping_list_generated,
+                                                      on_error=self.on_generate_error)
+
+    def on_shopping_list_generated(self, rows):
+        LOGGER.debug("Shopping list generated")
+
+        self.end_generate()
+        from .dialog.generate_shopping_list import GenerateShoppingListDialog
+        dialog = GenerateShoppingListDialog(rows)
         result = dialog.exec_()
         if result:
-            self.shopping_list.clear()
-            self.sig_db_changed.emit()
+            self.db_worker.submit(self.shopping_list.clear, on_result=lambda _: self.sig_db_changed.emit())
+
+    def on_generate_error(self, message):
+        self.end_generate()
+        self.on_db_error(message)
+
+    def on_btn_cancel_generate(self):
+        LOGGER.debug("btn_cancel_generate clicked")
+
+        if self.generate_task_id is not None:
+            self.db_worker.cancel(self.generate_task_id)
+        self.end_generate()
+
+    def end_generate(self):
+        self.generate_task_id = None
+        self.btn_cancel_generate.setVisible(False)
+        self.check_shopping_list()
 
     def update_lists_widgets(self):
         LOGGER.debug("sig_db_changed emit")
-        # Recipes from db
-        self.lw_recipes_from_db.clear()
-        for recipe in self.recipes_manager.get_all_recipes():
-            self.add_item_to_db_list(recipe)
 
-        # Recipes from shopping_list
-        self.lw_recipes_from_shopping_list.clear()
-        for recipe in self.shopping_list.get_all_recipes():
-            self.add_item_to_shopping_list(recipe)
+        if self.shopping_list is None:
+            # The lists are read when the database is loaded
+            return
+        self.db_worker.submit(self.read_lists, self.le_search.text(), on_result=self.on_lists_read)
+
+    def on_lists_read(self, lists):
+        recipes_from_db, recipes_from_shopping_list = lists
+
+        # Only the rows that changed are updated in the views
+        self.recipes_from_db_model.set_items(recipes_from_db)
+        self.recipes_from_shopping_list_model.set_items(recipes_from_shopping_list)
 
     def check_db_list(self):
-        LOGGER.debug("Signal count_changed on lw_recipes_from_db emit")
+        LOGGER.debug("Signal count_changed on recipes_from_db_model emit")
 
-        db_list_filled = self.lw_recipes_from_db.count() > 0
+        db_list_filled = self.recipes_from_db_model.item_count() > 0
         self.btn_add_to_shopping_list.setEnabled(db_list_filled)
 
     def check_shopping_list(self):
-        LOGGER.debug("Signal count_changed on lw_recipes_from_shopping_list emit")
+        LOGGER.debug("Signal count_changed on recipes_from_shopping_list_model emit")
+
+        shopping_list_filled = self.recipes_from_shopping_list_model.item_count() > 0
+        self.btn_generate_shopping_list.setEnabled(shopping_list_filled and self.generate_task_id is None)
+
+    def on_flush_timer_timeout(self):
+        # Not queued behind a running task, the next timeout will flush
+        if not self.db_worker.is_busy():
+            self.db_worker.submit(self.shopping_list.flush_if_due)
+
+    def on_db_busy_changed(self, busy):
+        if busy:
+            self.busy_timer.start()
+        else:
+            self.busy_timer.stop()
+            self.pb_busy.setVisible(False)
+            QtWidgets.QApplication.restoreOverrideCursor()
+
+    def on_busy_timer_timeout(self):
+        self.pb_busy.setVisible(True)
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.BusyCursor)
 
-        shopping_list_filled = self.lw_recipes_from_shopping_list.count() > 0
-        self.btn_generate_shopping_list.setEnabled(shopping_list_filled)
+    def on_db_error(self, message):
+        QtWidgets.QMessageBox.critical(self, "Erreur", f"Erreur de la base de donnée : {message}")
 
     def on_close_event(self, event):
         LOGGER.debug("Close window")
@@ -193,7 +342,9 @@ class MainWindow(QtWidgets.QMainWindow):
                                                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
                                                QtWidgets.QMessageBox.Yes)
         if reply:
-            self.shopping_list.close_db()
+            self.flush_timer.stop()
+            # Close the database in its thread once the pending tasks are done
+            self.db_worker.stop(last_task=self.shopping_list.close_db if self.shopping_list else None)
             LOGGER.debug("Database closed")
             event.accept()
         else:
@@ -201,17 +352,6 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # END SLOTS
 
-    def add_item_to_db_list(self, recipe):
-        item = QtWidgets.QListWidgetItem(recipe['title'])
-        item.recipe = recipe
-        self.lw_recipes_from_db.addItem(item)
-
-    def add_item_to_shopping_list(self, recipe):
-        title = recipe["recipe"]["title"]
-        item = QtWidgets.QListWidgetItem(f"{title} ({recipe['quantity']} parts)")
-        item.recipe = recipe
-        self.lw_recipes_from_shopping_list.addItem(item)
-
 
 if __name__ == '__main__':
     app = QtWidgets.QApplication()
@@ -0,0 +1,151 @@
+from PySide2 import QtCore
+
+
+def diff_keys(old_keys, new_keys):
+    """Return the operations that turn old_keys into new_keys, to apply in order
+
+    ("remove", first, count) then ("insert", position, count) where the inserted keys are new_keys[position:],
+    None if the keys in both lists are not in the same order
+    """
+    new_set = set(new_keys)
+    old_set = set(old_keys)
+    if [key for key in old_keys if key in new_set] != [key for key in new_keys if key in old_set]:
+        return None
+
+    operations = []
+    # Removes from the end, so the positions of the next ones stay valid
+    removes = []
+    for position, key in enumerate(old_keys):
+        if key in new_set:
+            continue
+        if removes and removes[-1][1] + removes[-1][2] == position:
+            removes[-1] = ("remove", removes[-1][1], removes[-1][2] + 1)
+        else:
+            removes.append(("remove", position, 1))
+    operations.extend(reversed(removes))
+
+    # Inserts from the start, the positions in new_keys are the final positions
+    for position, key in enumerate(new_keys):
+        if key in old_set:
+            continue
+        if operations and operations[-1][0] == "insert" and operations[-1][1] + operations[-1][2] == position:
+            operations[-1] = ("insert", operations[-1][1], operations[-1][2] + 1)
+        else:
+            operations.append(("insert", position, 1))
+    return operations
+
+
+class RecipesListModel(QtCore.QAbstractListModel):
+    """List model of recipes (or shopping list entries) updated row by row by set_items
+
+    Rows are given to the view by batches of FETCH_SIZE when it scrolls, so huge catalogs are shown at once.
+    """
+    # Role returning the recipe of a row
+    RecipeRole = QtCore.Qt.UserRole
+    FETCH_SIZE = 500
+
+    # Emit the number of items once by set_items, when it changed
+    count_changed = QtCore.Signal(int)
+
+    def __init__(self, key, display, parent=None):
+        """key(item) : unique key of an item, display(item) : text of an item"""
+        super().__init__(parent)
+
+        self._key = key
+        self._display = display
+        self._items = []
+        self._keys = []
+        # Number of rows given to the view, the first ones of _items
+        self._loaded = 0
+
+    # QAbstractListModel
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._loaded:
+            return None
+        item = self._items[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return self._display(item)
+        if role == self.RecipeRole:
+            return item
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._items)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        count = min(self.FETCH_SIZE, len(self._items) - self._loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    # ITEMS
+
+    def item(self, row: int):
+        """Return the item of a row, None if the row doesn't exist"""
+        if 0 <= row < len(self._items):
+            return self._items[row]
+        return None
+
+    def item_count(self):
+        """Return the number of items, including the ones not fetched by the view yet"""
+        return len(self._items)
+
+    def set_items(self, items):
+        """Replace the items, only the rows that changed are removed, inserted or updated in the view"""
+        items = list(items)
+        old_count = len(self._items)
+        new_keys = [self._key(item) for item in items]
+        operations = diff_keys(self._keys, new_keys)
+
+        if operations is None:
+            self.beginResetModel()
+            self._items = items
+            self._loaded = min(len(items), self.FETCH_SIZE)
+            self.endResetModel()
+        else:
+            for operation, position, count in operations:
+                if operation == "remove":
+                    self._remove_rows(position, count)
+                else:
+                    self._insert_rows(position, items[position:position + count])
+            # The kept items may have changed (quantity of an entry, title of a recipe)
+            changed_rows = [row for row in range(self._loaded) if items[row] != self._items[row]]
+            self._items = items
+            if changed_rows:
+                self.dataChanged.emit(self.index(changed_rows[0]), self.index(changed_rows[-1]))
+        self._keys = new_keys
+
+        if len(items) != old_count:
+            self.count_changed.emit(len(items))
+
+    def _remove_rows(self, first: int, count: int):
+        visible = max(0, min(first + count, self._loaded) - first)
+        if visible:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, first + visible - 1)
+        del self._items[first:first + count]
+        self._loaded -= visible
+        if visible:
+            self.endRemoveRows()
+
+    def _insert_rows(self, position: int, items):
+        if position < self._loaded:
+            visible = len(items)
+        elif position == self._loaded == len(self._items):
+            # Added at the end of a fully fetched list, the rest is fetched by the view
+            visible = min(len(items), self.FETCH_SIZE)
+        else:
+            visible = 0
+        if visible:
+            self.beginInsertRows(QtCore.QModelIndex(), position, position + visible - 1)
+        self._items[position:position] = items
+        self._loaded += visible
+        if visible:
+            self.endInsertRows()
@@ -0,0 +1,311 @@
+"""
+Search of recipes : fuzzy search by title and ingredients names with an index of the trigrams of their words,
+and inverted index of the ingredients to find recipes by the ingredients on hand
+"""
+import heapq
+import unicodedata
+from itertools import islice
+from typing import NamedTuple
+
+from units import DEFAULT_REGISTRY, normalize_text
+
+# Letters that are not decomposed by unicodedata
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+
+
+def fold_text(text: str):
+    """Case-fold a text, remove its accents and collapse its whitespaces ("Crème  Brûlée" -> "creme brulee")"""
+    decomposed = unicodedata.normalize("NFKD", normalize_text(text).translate(LIGATURES))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def split_words(text: str):
+    """Return the folded words of a text, punctuation separates words"""
+    return "".join(char if char.isalnum() else " " for char in fold_text(text)).split()
+
+
+def word_grams(word: str):
+    """Return the trigrams of a word padded with spaces, so the start and the end of the word count"""
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def query_grams(word: str):
+    """Return the trigrams of a searched word, not padded at the end so a prefix matches the whole word"""
+    padded = f" {word}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Index of the words of the recipes titles and ingredients names
+
+    Trigrams point to the distinct words, which point to the recipes, so a search only compares the query
+    to the vocabulary and then reads the postings of the matching words.
+    """
+    TITLE_WEIGHT = 2.0
+    INGREDIENT_WEIGHT = 1.0
+    # Part of the trigrams of a searched word that a word must contain to match it
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self):
+        # trigram -> words, word -> recipe ids for the titles and the ingredients
+        self._grams = {}
+        self._titles = {}
+        self._ingredients = {}
+        # recipe id -> (title words, ingredients words), used to remove a recipe
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, id, title: str, ingredients_names):
+        """Index a recipe, replace it if it is already indexed"""
+        self.remove(id)
+        title_words = set(split_words(title))
+        ingredients_words = {word for name in ingredients_names for word in split_words(name)}
+        self._documents[id] = (title_words, ingredients_words)
+        for postings, words in ((self._titles, title_words), (self._ingredients, ingredients_words)):
+            for word in words:
+                if word not in self._titles and word not in self._ingredients:
+                    for gram in word_grams(word):
+                        self._grams.setdefault(gram, set()).add(word)
+                postings.setdefault(word, set()).add(id)
+
+    def remove(self, id):
+        """Remove a recipe from the index, do nothing if it is not indexed"""
+        document = self._documents.pop(id, None)
+        if document is None:
+            return
+        for postings, words in zip((self._titles, self._ingredients), document):
+            for word in words:
+                ids = postings[word]
+                ids.discard(id)
+                if ids:
+                    continue
+                del postings[word]
+                if word in self._titles or word in self._ingredients:
+                    continue
+                # The word is not used anymore
+                for gram in word_grams(word):
+                    words_of_gram = self._grams[gram]
+                    words_of_gram.discard(word)
+                    if not words_of_gram:
+                        del self._grams[gram]
+
+    def _similar_words(self, query_word: str):
+        """Return {word: similarity} of the words of the vocabulary matching a searched word"""
+        grams = query_grams(query_word)
+        if not grams:
+            return {}
+        counts = {}
+        for gram in grams:
+            for word in self._grams.get(gram, ()):
+                counts[word] = counts.get(word, 0) + 1
+        similar = {}
+        for word, count in counts.items():
+            similarity = count / len(grams)
+            if similarity < self.MIN_SIMILARITY:
+                continue
+            # Whole words first, then prefixes, then the shortest words
+            similarity += 0.1 * count / (len(word) + 1)
+            if word == query_word:
+                similarity += 1
+            elif word.startswith(query_word):
+                similarity += 0.5
+            similar[word] = similarity
+        return similar
+
+    def _levels(self, query_word: str):
+        """Return [(score, recipe ids)] of the words matching a searched word, the best first"""
+        levels = []
+        for word, similarity in self._similar_words(query_word).items():
+            for postings, weight in ((self._titles, self.TITLE_WEIGHT), (self._ingredients, self.INGREDIENT_WEIGHT)):
+                ids = postings.get(word)
+                if ids:
+                    levels.append((similarity * weight, ids))
+        levels.sort(key=lambda level: level[0], reverse=True)
+        return levels
+
+    def search(self, query: str, limit: int = None):
+        """Return the ids of the recipes matching all the words of query, the best first
+
+        A word matches the words of the titles and ingredients names with enough trigrams in common,
+        so typos and missing accents are tolerated. Words of one letter are ignored.
+        The score of a recipe for a searched word is the one of its best matching word, the scores of the
+        searched words are added.
+        """
+        query_words = [word for word in dict.fromkeys(split_words(query)) if len(word) > 1]
+        levels_by_word = [self._levels(word) for word in query_words]
+        if not levels_by_word or not all(levels_by_word):
+            return []
+
+        if limit is None:
+            # All the combinations of levels would be needed, scoring each recipe once is cheaper
+            return self._score_all(levels_by_word)
+
+        # A recipe is kept only in its best level for each searched word, the levels of a word are computed in
+        # order when needed, from the recipes already found in the previous ones
+        best_levels = [[] for _ in levels_by_word]
+        seen = [None] * len(levels_by_word)
+        # Approximate number of set items read, see below
+        cost = 0
+
+        def best_level(word_index, level_index):
+            nonlocal cost
+            levels = levels_by_word[word_index]
+            computed = best_levels[word_index]
+            while len(computed) <= level_index:
+                ids = levels[len(computed)][1]
+                if not computed:
+                    # The first level is used as it is, it is not modified
+                    computed.append(ids)
+                    continue
+                if seen[word_index] is None:
+                    seen[word_index] = set(levels[0][1])
+                    cost += len(levels[0][1])
+                computed.append(ids - seen[word_index])
+                seen[word_index] |= ids
+                cost += 2 * len(ids)
+            return computed[level_index]
+
+        def score(combination):
+            return sum(levels_by_word[word_index][level_index][0] for word_index, level_index in enumerate(combination))
+
+        # The combinations of levels give the recipes by decreasing score, with set operations only. They are
+        # enumerated lazily, the best first : the next ones of a combination add 1 to one of its levels from its
+        # last increased one, so each combination is reached once and never before a better one.
+        # Sparse matches may need many combinations, once their intersections have cost as much as reading half
+        # of the postings, the recipes are scored directly.
+        budget = sum(len(ids) for levels in levels_by_word for _, ids in levels) // 2
+        start = (0,) * len(levels_by_word)
+        heap = [(-score(start), 0, start)]
+        found = []
+        while heap:
+            _, last, combination = heapq.heappop(heap)
+            sets = sorted((best_level(word_index, level_index) for word_index, level_index in enumerate(combination)),
+                          key=len)
+            matches = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            found.extend(islice(matches, limit - len(found)))
+            if len(found) >= limit:
+                return found
+            cost += len(sets[0]) + len(combination) ** 2
+            if cost > budget:
+                return self._score_all(levels_by_word)[:limit]
+            for word_index in range(last, len(combination)):
+                if combination[word_index] + 1 < len(levels_by_word[word_index]):
+                    next_combination = combination[:word_index] + (combination[word_index] + 1,) + \
+                                       combination[word_index + 1:]
+                    heapq.heappush(heap, (-score(next_combination), word_index, next_combination))
+        return found
+
+    @staticmethod
+    def _score_all(levels_by_word):
+        """Return the ids of the recipes matching all the searched words by decreasing score, from all the levels"""
+        totals = None
+        for levels in levels_by_word:
+            # The levels are sorted, the first one of a recipe is its best
+            best = {}
+            for score, ids in levels:
+                for id in ids:
+                    best.setdefault(id, score)
+            if totals is None:
+                totals = best
+            else:
+                totals = {id: total + best[id] for id, total in totals.items() if id in best}
+        return sorted(totals, key=totals.__getitem__, reverse=True)
+
+
+class Coverage(NamedTuple):
+    """Part of the ingredients of a recipe found in a pantry"""
+    id: object
+    coverage: float
+    missing: tuple
+
+
+class IngredientsIndex:
+    """Inverted index of the normalized ingredients names of the recipes"""
+
+    def __init__(self, units=DEFAULT_REGISTRY):
+        """units : UnitRegistry used to normalize the names, like the aggregation of the shopping lists"""
+        self.units = units
+        # name -> recipe ids, recipe id -> names, number of names -> recipe ids
+        self._recipes = {}
+        self._names = {}
+        self._sizes = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def normalize(self, names):
+        """Return the set of the normalized names"""
+        return {self.units.normalize_name(name) for name in names}
+
+    def add(self, id, ingredients_names):
+        """Index a recipe, replace it if it is already indexed"""
+        self.remove(id)
+        names = self.normalize(ingredients_names)
+        self._names[id] = names
+        self._sizes.setdefault(len(names), set()).add(id)
+        for name in names:
+            self._recipes.setdefault(name, set()).add(id)
+
+    def remove(self, id):
+        """Remove a recipe from the index, do nothing if it is not indexed"""
+        names = self._names.pop(id, None)
+        if names is None:
+            return
+        for name in names:
+            ids = self._recipes[name]
+            ids.discard(id)
+            if not ids:
+                del self._recipes[name]
+        ids = self._sizes[len(names)]
+        ids.discard(id)
+        if not ids:
+            del self._sizes[len(names)]
+
+    def names(self):
+        """Return the normalized names of all the ingredients"""
+        return set(self._recipes)
+
+    def with_all(self, names):
+        """Return the ids of the recipes using all the ingredients"""
+        sets = sorted((self._recipes.get(name, set()) for name in self.normalize(names)), key=len)
+        if not sets:
+            return set()
+        return sets[0].intersection(*sets[1:])
+
+    def with_any(self, names):
+        """Return the ids of the recipes using at least one of the ingredients"""
+        return set().union(*(self._recipes.get(name, ()) for name in self.normalize(names)))
+
+    def coverage(self, pantry, limit: int = None, min_coverage: float = 0.0):
+        """Rank the recipes using at least one ingredient of the pantry by coverage, then by number of missing
+        ingredients, return a list of Coverage
+
+        The coverage of a recipe is the part of its ingredients found in the pantry (names of ingredients)
+        """
+        pantry = self.normalize(pantry)
+        # at_least[count] : ids of the recipes with at least count ingredients in the pantry, with set operations only
+        at_least = [set()]
+        for ids in (self._recipes[name] for name in pantry if name in self._recipes):
+            at_least.append(at_least[-1] & ids)
+            for count in range(len(at_least) - 2, 1, -1):
+                at_least[count] |= at_least[count - 1] & ids
+            at_least[1] |= ids
+        at_least.append(set())
+
+        # Groups of recipes with the same number of ingredients in the pantry and the same number of ingredients,
+        # so with the same coverage and missing ingredients count, the best first
+        groups = sorted(((count, size) for count in range(1, len(at_least) - 1) for size in self._sizes
+                         if count <= size and count / size >= min_coverage),
+                        key=lambda group: (-group[0] / group[1], group[1] - group[0]))
+        results = []
+        for count, size in groups:
+            ids = (at_least[count] - at_least[count + 1]) & self._sizes[size]
+            for id in ids:
+                missing = self._names[id] - pantry
+                results.append(Coverage(id=id, coverage=count / size, missing=tuple(sorted(missing))))
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
@@ -0,0 +1,450 @@
+"""
+Headless HTTP service of the shopping lists : JSON endpoints on one database, without the Qt interface
+
+A fixed pool of threads serves the connections. All of them call the same AsyncShoppingLists, run by an event loop
+in its own thread : the recipes cache and indexes are shared by all the requests, and the writes of concurrent
+requests are coalesced in batches written once (see async_api).
+
+Endpoints, bodies and responses in JSON :
+GET    /recipes                          {"id", "title"} of all the recipes, ?q= search words, ?limit=
+POST   /recipes                          {"title", "ingredients"} or a list of them -> {"ids"}
+GET    /recipes/<id>
+PUT    /recipes/<id>                     {"ingredients"}
+DELETE /recipes/<id>
+GET    /lists                            names of the lists
+POST   /lists                            {"name"}
+GET    /lists/<name>                     entries {"id", "quantity", "recipe"}
+DELETE /lists/<name>
+POST   /lists/<name>/recipes             {"recipe_id" or "title", "quantity"}
+PUT    /lists/<name>/recipes/<entry id>  {"quantity"}
+DELETE /lists/<name>/recipes/<entry id>
+POST   /lists/<name>/generate            {"rebuild", "subtract_pantry"} -> [{"name", "quantity"}]
+GET    /lists/<name>/export              ?format= (see export.WRITERS), sort_by, group_by, subtract_pantry=1,
+                                         written in chunks while it is serialized
+
+python server.py test.json --port 8080 --threads 16
+Load test : python -m benchmarks.bench_server
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import re
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from api import validate_recipe
+from async_api import BATCH_SIZE, MAX_PENDING, AsyncShoppingLists
+from export import GROUP_KEYS, SORT_KEYS, WRITERS, export
+
+LOGGER = logging.getLogger(__name__)
+
+# Default number of threads serving the connections
+THREADS = 16
+# Maximum size of a request body
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# Size of the chunks of the streamed exports
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    "text": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/jsonl; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+}
+
+
+class HTTPError(Exception):
+    """Error returned to the client with its status"""
+
+    def __init__(self, status: HTTPStatus, message: str = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class ShoppingService:
+    """Event loop thread running the AsyncShoppingLists of the database, called from the HTTP threads"""
+
+    def __init__(self, db_path, **options):
+        """options are passed to AsyncShoppingLists.open (batch_size, max_pending, storage_format, catalog_path...)"""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="event-loop", daemon=True)
+        self._thread.start()
+        self.lists = self.call(AsyncShoppingLists.open(db_path, **options))
+        self.recipes_manager = self.lists.recipes_manager
+
+    def call(self, coroutine):
+        """Run coroutine in the event loop, wait for its result in the calling thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def get_list(self, name: str):
+        """Return the AsyncShoppingList named name, raise HTTPError 404 if it doesn't exist"""
+        shopping_list = self.call(self.lists.get(name, create=False))
+        if shopping_list is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Liste inconnue : {name}")
+        return shopping_list
+
+    def close(self):
+        """Wait for the pending writes, close the database and stop the event loop"""
+        self.call(self.lists.close_db())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def _recipe_to_json(recipe: dict):
+    return {**recipe, "ingredients": [ingredient.to_dict() for ingredient in recipe["ingredients"]]}
+
+
+def _quantity(body: dict, default=None):
+    """Return the positive number body["quantity"], raise HTTPError 400 if it is not one"""
+    quantity = body.get("quantity", default)
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"quantity must be a positive number, got {quantity!r}")
+    return quantity
+
+
+def _flag(value: str):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class _ChunkedWriter(io.TextIOBase):
+    """Text file writing to the response in chunks of the chunked transfer encoding"""
+
+    def __init__(self, wfile, chunk_size: int = CHUNK_SIZE):
+        self._wfile = wfile
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self._size = 0
+
+    def write(self, text: str):
+        data = text.encode("utf-8")
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._size >= self._chunk_size:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self._size:
+            data = b"".join(self._buffer)
+            self._wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self._buffer = []
+            self._size = 0
+
+    def close(self):
+        """Send the last chunks and the end of the response, the connection stays open"""
+        if not self.closed:
+            self.flush()
+            self._wfile.write(b"0\r\n\r\n")
+        super().close()
+
+
+class ShoppingRequestHandler(BaseHTTPRequestHandler):
+    """Route the requests to the ShoppingService of the server (server.service)"""
+    protocol_version = "HTTP/1.1"
+    server_version = "PyShopping"
+    # An idle keep-alive connection holds a thread of the pool, it is closed after this delay (in seconds)
+    timeout = 30
+    # The headers and the body are sent in two writes, Nagle's algorithm would delay the body until the client ACKs
+    disable_nagle_algorithm = True
+
+    # (method, path pattern, name of the handler method), the groups of the pattern are its arguments
+    ROUTES = [
+        ("GET", r"/recipes", "list_recipes"),
+        ("POST", r"/recipes", "add_recipes"),
+        ("GET", r"/recipes/([^/]+)", "get_recipe"),
+        ("PUT", r"/recipes/([^/]+)", "update_recipe"),
+        ("DELETE", r"/recipes/([^/]+)", "delete_recipe"),
+        ("GET", r"/lists", "list_names"),
+        ("POST", r"/lists", "create_list"),
+        ("GET", r"/lists/([^/]+)", "get_list"),
+        ("DELETE", r"/lists/([^/]+)", "delete_list"),
+        ("POST", r"/lists/([^/]+)/recipes", "add_to_list"),
+        ("PUT", r"/lists/([^/]+)/recipes/([^/]+)", "update_in_list"),
+        ("DELETE", r"/lists/([^/]+)/recipes/([^/]+)", "delete_from_list"),
+        ("POST", r"/lists/([^/]+)/generate", "generate_list"),
+        ("GET", r"/lists/([^/]+)/export", "export_list"),
+    ]
+    ROUTES = [(method, re.compile(pattern + "/?"), name) for method, pattern, name in ROUTES]
+
+    @property
+    def service(self) -> ShoppingService:
+        return self.server.service
+
+    def do_GET(self):
+        self._dispatch()
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            handler, args = self._route(url.path)
+            result = handler(*args)
+            # None : the handler has sent its response itself
+            if result is not None:
+                self._send_json(*result)
+        except HTTPError as e:
+            self._send_error(e.status, str(e))
+        except KeyError as e:
+            self._send_error(HTTPStatus.NOT_FOUND, f"Introuvable : {e}")
+        except (ValueError, TypeError) as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except io.UnsupportedOperation as e:
+            self._send_error(HTTPStatus.METHOD_NOT_ALLOWED, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            LOGGER.exception("Error in %s %s", self.command, self.path)
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+
+    def _route(self, path: str):
+        """Return (handler method, arguments) of the request, raise HTTPError 404 or 405"""
+        path_found = False
+        for method, pattern, name in self.ROUTES:
+            match = pattern.fullmatch(path)
+            if match:
+                if method == self.command:
+                    return getattr(self, name), [unquote(group) for group in match.groups()]
+                path_found = True
+        if path_found:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    def _read_json(self):
+        """Return the JSON body of the request"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = self.rfile.read(length)
+        try:
+            return json.loads(body) if body else {}
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid JSON : {e}")
+
+    def _read_object(self):
+        body = self._read_json()
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object")
+        return body
+
+    def _send_json(self, status: HTTPStatus, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: HTTPStatus, message: str):
+        # The body of a failed request may not have been read, the connection can't be reused
+        self.close_connection = True
+        self._send_json(status, {"error": message})
+
+    def log_message(self, format, *args):
+        LOGGER.info("%s - %s", self.address_string(), format % args)
+
+    # RECIPES
+    def list_recipes(self):
+        recipes_manager = self.service.recipes_manager
+        limit = int(self.query["limit"]) if "limit" in self.query else None
+        if "q" in self.query:
+            return HTTPStatus.OK, self.service.call(recipes_manager.search(self.query["q"], limit=limit))
+        return HTTPStatus.OK, self.service.call(recipes_manager.get_all_titles())[:limit]
+
+    def add_recipes(self):
+        body = self._read_json()
+        recipes = body if isinstance(body, list) else [body]
+        for recipe in recipes:
+            if not isinstance(recipe, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid recipe : {recipe!r}")
+            validate_recipe(recipe)
+        return HTTPStatus.CREATED, {"ids": self.service.call(self.service.recipes_manager.add_recipes(recipes))}
+
+    def _get_recipe(self, id: str):
+        recipe = self.service.call(self.service.recipes_manager.get_recipe_by_id(id))
+        if recipe is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Recette inconnue : {id}")
+        return recipe
+
+    def get_recipe(self, id: str):
+        return HTTPStatus.OK, _recipe_to_json(self._get_recipe(id))
+
+    def update_recipe(self, id: str):
+        title = self._get_recipe(id)["title"]
+        _, ingredients = validate_recipe({**self._read_object(), "title": title})
+        self.service.call(self.service.recipes_manager.update_recipe_by_title(title, ingredients))
+        return HTTPStatus.OK, _recipe_to_json(self._get_recipe(id))
+
+    def delete_recipe(self, id: str):
+        self._get_recipe(id)
+        # The documents of the recipes table are numbered by their id
+        self.service.call(self.service.recipes_manager.delete_recipe_by_id(int(id)))
+        return HTTPStatus.OK, {"id": id}
+
+    # LISTS
+    def list_names(self):
+        return HTTPStatus.OK, self.service.call(self.service.lists.names())
+
+    def create_list(self):
+        name = self._read_object().get("name")
+        self.service.call(self.service.lists.get(name))
+        return HTTPStatus.CREATED, {"name": name}
+
+    def get_list(self, name: str):
+        entries = self.service.call(self.service.get_list(name).get_all_recipes())
+        return HTTPStatus.OK, [{**entry, "recipe": _recipe_to_json(entry["recipe"])} for entry in entries]
+
+    def delete_list(self, name: str):
+        if not self.service.call(self.service.lists.delete(name)):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Liste inconnue : {name}")
+        return HTTPStatus.OK, {"name": name}
+
+    def add_to_list(self, name: str):
+        shopping_list = self.service.get_list(name)
+        body = self._read_object()
+        quantity = _quantity(body, default=1)
+        if "recipe_id" in body:
+            added = self.service.call(shopping_list.add_recipe_by_id(str(body["recipe_id"]), quantity))
+        else:
+            added = self.service.call(shopping_list.add_recipe_by_title(body.get("title"), quantity))
+        if not added:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Recette inconnue")
+        return HTTPStatus.CREATED, {"added": True}
+
+    def _check_entry(self, shopping_list, entry_id: str):
+        if not self.service.call(shopping_list.get_recipes_by_id(entry_id)):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Entrée inconnue : {entry_id}")
+
+    def update_in_list(self, name: str, entry_id: str):
+        shopping_list = self.service.get_list(name)
+        quantity = _quantity(self._read_object())
+        self._check_entry(shopping_list, entry_id)
+        self.service.call(shopping_list.update_recipe_by_id(entry_id, quantity))
+        return HTTPStatus.OK, {"id": entry_id, "quantity": quantity}
+
+    def delete_from_list(self, name: str, entry_id: str):
+        shopping_list = self.service.get_list(name)
+        self._check_entry(shopping_list, entry_id)
+        self.service.call(shopping_list.delete_recipe_by_id(entry_id))
+        return HTTPStatus.OK, {"id": entry_id}
+
+    def generate_list(self, name: str):
+        body = self._read_object()
+        rows = self.service.call(self.service.lists.generate(name, rebuild=bool(body.get("rebuild")),
+                                                             subtract_pantry=bool(body.get("subtract_pantry"))))
+        return HTTPStatus.OK, [{"name": name, "quantity": quantity} for name, quantity in rows]
+
+    def export_list(self, name: str):
+        """Stream the list in the format of the query, the rows are serialized while they are sent"""
+        format = self.query.get("format", "text")
+        if format not in WRITERS:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"format must be one of {list(WRITERS)}, got {format!r}")
+        sort_by, group_by = self.query.get("sort_by"), self.query.get("group_by")
+        # Checked here, an unknown key would raise a KeyError in iter_rows and be answered as not found
+        if sort_by is not None and sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {list(SORT_KEYS)}, got {sort_by!r}")
+        if group_by is not None and group_by not in GROUP_KEYS:
+            raise ValueError(f"group_by must be one of {list(GROUP_KEYS)}, got {group_by!r}")
+        rows = self.service.call(self.service.get_list(name).iter_rows(
+            sort_by=sort_by, group_by=group_by,
+            subtract_pantry=_flag(self.query.get("subtract_pantry", ""))))
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPES[format])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        file = _ChunkedWriter(self.wfile)
+        try:
+            export(rows, file, format=format)
+        except Exception:
+            # The status is already sent, the response is left without its last chunk so the client sees it failed
+            LOGGER.exception("Error in %s %s", self.command, self.path)
+            self.close_connection = True
+            return None
+        file.close()
+        return None
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer handling the connections in a fixed pool of threads, instead of one new thread by connection"""
+    # The connections of a burst of clients wait in the listen queue instead of being refused
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, threads: int = THREADS):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+def make_server(db_path, host: str = "127.0.0.1", port: int = 8080, threads: int = THREADS, **options):
+    """Open the database and return a PooledHTTPServer serving it, not started yet
+
+    options are passed to ShoppingService. Start it with serve_forever, stop it with shutdown and close it with
+    close_server, which waits for the pending writes.
+    """
+    service = ShoppingService(db_path, **options)
+    try:
+        server = PooledHTTPServer((host, port), ShoppingRequestHandler, threads=threads)
+    except Exception:
+        service.close()
+        raise
+    server.service = service
+    return server
+
+
+def close_server(server: PooledHTTPServer):
+    """Close the socket and the thread pool of server, then its database"""
+    server.server_close()
+    server.service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a PyShopping database over HTTP")
+    parser.add_argument("db_path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 to use a free port")
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--format", dest="storage_format", default="json")
+    parser.add_argument("--catalog", dest="catalog_path", default=None)
+    parser.add_argument("--quiet", action="store_true", help="don't log the requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s")
+    server = make_server(args.db_path, host=args.host, port=args.port, threads=args.threads,
+                         batch_size=args.batch_size, max_pending=args.max_pending,
+                         storage_format=args.storage_format, catalog_path=args.catalog_path)
+    host, port = server.server_address[:2]
+    print(f"Serveur sur http://{host}:{port}", flush=True)
+    # Stopped by a service manager : the pending writes are written like on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_server(server)
@@ -0,0 +1,550 @@
+"""
+SQLite backend with the same API as RecipesManager and ShoppingList
+
+Migrate a TinyDB database :
+python sqlite_api.py test.json test.sqlite
+"""
+import argparse
+import sqlite3
+import time
+from typing import Iterable, List
+
+from aggregation import subtract_stock
+from api import (Ingredient, IngredientBatch, ImportReport, RecipesIndex, normalize_stock_item, read_pantry_file,
+                 read_recipes_file, validate_recipe)
+from export import export, iter_rows
+from search import IngredientsIndex, SearchIndex
+from storages import open_db
+from units import DEFAULT_REGISTRY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS ingredients (
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity NUMERIC NOT NULL,
+    unit TEXT NOT NULL,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS ingredients_name_unit ON ingredients(name, unit);
+CREATE TABLE IF NOT EXISTS recipes_list (
+    id INTEGER PRIMARY KEY,
+    recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+    quantity NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recipes_list_recipe_id ON recipes_list(recipe_id);
+CREATE TABLE IF NOT EXISTS shopping_list (
+    name TEXT NOT NULL,
+    quantity TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pantry (
+    name TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    quantity NUMERIC NOT NULL,
+    PRIMARY KEY (name, unit)
+);
+"""
+
+
+def connect(db_path):
+    """Open a SQLite database and create the tables if needed"""
+    connection = sqlite3.connect(str(db_path))
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SQLiteRecipesManager:
+    """Recipes manager that use SQLite to store data"""
+
+    def __init__(self, connection):
+        """connection : a sqlite3 connection, or the path of a SQLite database"""
+        if not isinstance(connection, sqlite3.Connection):
+            connection = connect(connection)
+        self.connection = connection
+        # Built by the first search, then updated after each committed change of the recipes
+        self._search_index = None
+        self._ingredients_index = None
+
+    def _next_free_title(self, title: str):
+        """Return title if it is free, else the base title with the next free suffix (like RecipesIndex)"""
+        if not self.connection.execute("SELECT 1 FROM recipes WHERE title = ?", (title,)).fetchone():
+            return title
+        base, _ = RecipesIndex.split_title(title)
+        # Titles starting with "base_" are between "base_" and "base`" ("`" follows "_")
+        rows = self.connection.execute("SELECT title FROM recipes WHERE title > ? AND title < ?",
+                                       (f"{base}_", f"{base}`"))
+        max_suffix = 0
+        for row in rows:
+            row_base, number = RecipesIndex.split_title(row[0])
+            if row_base == base:
+                max_suffix = max(max_suffix, number)
+        return f"{base}_{str(max_suffix + 1).zfill(2)}"
+
+    def _insert(self, title: str, ingredients: List[Ingredient], id=None):
+        """Insert a recipe without committing, return its id"""
+        cursor = self.connection.execute("INSERT INTO recipes (id, title) VALUES (?, ?)", (id, title))
+        recipe_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO ingredients (recipe_id, position, name, quantity, unit) VALUES (?, ?, ?, ?, ?)",
+            [(recipe_id, position, ingredient.name, ingredient.quantity, ingredient.unit)
+             for position, ingredient in enumerate(ingredients)])
+        return recipe_id
+
+    def _index_recipe(self, recipe_id: int, title: str, ingredients: List[Ingredient]):
+        """Add or update a recipe in the search and ingredients indexes if they are built"""
+        names = [ingredient.name for ingredient in ingredients]
+        if self._search_index is not None:
+            self._search_index.add(str(recipe_id), title, names)
+        if self._ingredients_index is not None:
+            self._ingredients_index.add(str(recipe_id), names)
+
+    def _unindex_recipe(self, recipe_id):
+        if recipe_id is None:
+            return
+        if self._search_index is not None:
+            self._search_index.remove(str(recipe_id))
+        if self._ingredients_index is not None:
+            self._ingredients_index.remove(str(recipe_id))
+
+    def _get_ingredients_names(self):
+        """Return {recipe id: [ingredients names]}"""
+        names = {}
+        for recipe_id, name in self.connection.execute("SELECT recipe_id, name FROM ingredients"):
+            names.setdefault(recipe_id, []).append(name)
+        return names
+
+    def _get_search_index(self):
+        """Return the search index, build it if needed"""
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            names = self._get_ingredients_names()
+            for recipe_id, title in self.connection.execute("SELECT id, title FROM recipes"):
+                self._search_index.add(str(recipe_id), title, names.get(recipe_id, []))
+        return self._search_index
+
+    def _get_ingredients_index(self):
+        """Return the ingredients index, build it if needed"""
+        if self._ingredients_index is None:
+            self._ingredients_index = IngredientsIndex()
+            names = self._get_ingredients_names()
+            for recipe_id, in self.connection.execute("SELECT id FROM recipes"):
+                self._ingredients_index.add(str(recipe_id), names.get(recipe_id, []))
+        return self._ingredients_index
+
+    def _get_titles(self, ids):
+        """Return the {"id", "title"} of recipes, in the order of ids"""
+        ids = list(ids)
+        titles = {}
+        # Stay under the SQLite limit of parameters by query
+        for start in range(0, len(ids), 500):
+            chunk = [int(id) for id in ids[start:start + 500]]
+            placeholders = ", ".join("?" * len(chunk))
+            for id, title in self.connection.execute(f"SELECT id, title FROM recipes WHERE id IN ({placeholders})",
+                                                     chunk):
+                titles[str(id)] = title
+        return [{"id": id, "title": titles[id]} for id in ids if id in titles]
+
+    def _get_ingredients(self, recipe_id: int):
+        rows = self.connection.execute(
+            "SELECT name, quantity, unit FROM ingredients WHERE recipe_id = ? ORDER BY position", (recipe_id,))
+        return [Ingredient(name=name, quantity=quantity, unit=unit) for name, quantity, unit in rows]
+
+    def _recipe(self, row):
+        """Build a recipe like RecipesManager from a (id, title) row"""
+        if row is None:
+            return None
+        recipe_id, title = row
+        return {"title": title,
+                "ingredients": self._get_ingredients(recipe_id),
+                "id": str(recipe_id)}
+
+    # PUBLICS METHODS CRUD
+
+    # CREATE
+    def add_recipe(self, title: str, ingredients: List[Ingredient]):
+        """Add recipe to the database, a suffix (_01, _02...) is added to the title if it is already used"""
+        title = self._next_free_title(title)
+        with self.connection:
+            recipe_id = self._insert(title, ingredients)
+        self._index_recipe(recipe_id, title, ingredients)
+
+    def add_recipes(self, recipes: Iterable[dict]):
+        """Add several recipes to the database in one transaction, return the ids of the added recipes"""
+        added = []
+        with self.connection:
+            for recipe in recipes:
+                title, ingredients = validate_recipe(recipe)
+                title = self._next_free_title(title)
+                added.append((self._insert(title, ingredients), title, ingredients))
+        for recipe_id, title, ingredients in added:
+            self._index_recipe(recipe_id, title, ingredients)
+        return [str(recipe_id) for recipe_id, _, _ in added]
+
+    def import_recipes(self, path, format: str = None):
+        """Import recipes from a JSON or CSV file (see read_recipes_file) in one transaction"""
+        start = time.perf_counter()
+        ids = self.add_recipes(read_recipes_file(path, format=format))
+        return ImportReport(count=len(ids), seconds=time.perf_counter() - start)
+
+    # READ
+    def get_recipes_by_ids(self, ids):
+        """Get several recipes from the database, return a dict indexed by id"""
+        ids = list({int(id) for id in ids})
+        recipes = {}
+        # Stay under the SQLite limit of parameters by query
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for id, title in self.connection.execute(f"SELECT id, title FROM recipes WHERE id IN ({placeholders})",
+                                                     chunk):
+                recipes[id] = {"title": title, "ingredients": [], "id": str(id)}
+            rows = self.connection.execute(f"SELECT recipe_id, name, quantity, unit FROM ingredients "
+                                           f"WHERE recipe_id IN ({placeholders}) ORDER BY recipe_id, position", chunk)
+            for recipe_id, name, quantity, unit in rows:
+                recipes[recipe_id]["ingredients"].append(Ingredient(name=name, quantity=quantity, unit=unit))
+        return {recipe["id"]: recipe for recipe in recipes.values()}
+
+    def get_ingredients_by_ids(self, ids):
+        """Get the ingredients of several recipes, return a dict of IngredientBatch indexed by id"""
+        return {id: IngredientBatch.from_ingredients(recipe["ingredients"])
+                for id, recipe in self.get_recipes_by_ids(ids).items()}
+
+    def get_recipe_by_id(self, id):
+        row = self.connection.execute("SELECT id, title FROM recipes WHERE id = ?", (int(id),)).fetchone()
+        return self._recipe(row)
+
+    def get_all_recipes(self):
+        """Get all the recipes of the database"""
+        ids = [id for id, in self.connection.execute("SELECT id FROM recipes ORDER BY id")]
+        return list(self.get_recipes_by_ids(ids).values())
+
+    def get_all_titles(self):
+        """Get the {"id", "title"} of all the recipes"""
+        rows = self.connection.execute("SELECT id, title FROM recipes ORDER BY id")
+        return [{"id": str(id), "title": title} for id, title in rows]
+
+    def search(self, query: str, limit: int = None):
+        """Search recipes by words of their title and ingredients names, see RecipesManager.search"""
+        return self._get_titles(self._get_search_index().search(query, limit=limit))
+
+    def get_recipes_by_ingredients(self, names: Iterable[str], match_all: bool = True):
+        """See RecipesManager.get_recipes_by_ingredients"""
+        ingredients_index = self._get_ingredients_index()
+        ids = ingredients_index.with_all(names) if match_all else ingredients_index.with_any(names)
+        return self._get_titles(sorted(ids, key=int))
+
+    def rank_by_pantry(self, pantry: Iterable[str], limit: int = None, min_coverage: float = 0.0):
+        """See RecipesManager.rank_by_pantry"""
+        ranked = self._get_ingredients_index().coverage(pantry, limit=limit, min_coverage=min_coverage)
+        return [{**titles, "coverage": coverage.coverage, "missing": coverage.missing}
+                for titles, coverage in zip(self._get_titles(coverage.id for coverage in ranked), ranked)]
+
+    def get_recipe_by_title(self, title: str):
+        """Get a recipe from the database by title"""
+        row = self.connection.execute("SELECT id, title FROM recipes WHERE title = ?", (title,)).fetchone()
+        return self._recipe(row)
+
+    # UPDATE
+    def update_recipe_by_title(self, title: str, ingredients: List[Ingredient]):
+        """Update a recipe in the database"""
+        row = self.connection.execute("SELECT id FROM recipes WHERE title = ?", (title,)).fetchone()
+        if row is None:
+            return
+        with self.connection:
+            self.connection.execute("DELETE FROM ingredients WHERE recipe_id = ?", row)
+            self.connection.executemany(
+                "INSERT INTO ingredients (recipe_id, position, name, quantity, unit) VALUES (?, ?, ?, ?, ?)",
+                [(row[0], position, ingredient.name, ingredient.quantity, ingredient.unit)
+                 for position, ingredient in enumerate(ingredients)])
+        self._index_recipe(row[0], title, ingredients)
+
+    # DELETE
+    def delete_recipe_by_title(self, title: str):
+        """Delete a recipe from the database by title"""
+        row = self.connection.execute("SELECT id FROM recipes WHERE title = ?", (title,)).fetchone()
+        with self.connection:
+            self.connection.execute("DELETE FROM recipes WHERE title = ?", (title,))
+        self._unindex_recipe(row[0] if row else None)
+
+    def delete_recipe_by_id(self, id):
+        """Delete a recipe from the database by id"""
+        with self.connection:
+            self.connection.execute("DELETE FROM recipes WHERE id = ?", (int(id),))
+        self._unindex_recipe(int(id))
+
+    def print_recipes(self):
+        """Return a string with recipes for print"""
+        text = ""
+        for id, title in self.connection.execute("SELECT id, title FROM recipes ORDER BY id"):
+            text += f"{id} => {title}\n"
+        return text
+
+
+class SQLitePantry:
+    """Stock of the ingredients on hand stored in SQLite, same API as api.Pantry"""
+
+    def __init__(self, connection, unit_registry=DEFAULT_REGISTRY):
+        """connection : a sqlite3 connection, or the path of a SQLite database"""
+        if not isinstance(connection, sqlite3.Connection):
+            connection = connect(connection)
+        self.connection = connection
+        self.unit_registry = unit_registry
+
+    def _count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pantry").fetchone()[0]
+
+    # READ
+    def get_stock(self):
+        """Return {(name, unit): quantity} of the ingredients in stock"""
+        return {(name, unit): quantity
+                for name, unit, quantity in self.connection.execute("SELECT name, unit, quantity FROM pantry")}
+
+    def get_quantity(self, name: str, unit: str):
+        """Return the quantity in stock of an ingredient, in the canonical unit of unit, 0 if there is none"""
+        (name, unit), _ = normalize_stock_item({"name": name, "quantity": 0, "unit": unit}, self.unit_registry)
+        row = self.connection.execute("SELECT quantity FROM pantry WHERE name = ? AND unit = ?", (name, unit))
+        row = row.fetchone()
+        return 0 if row is None else row[0]
+
+    def subtract(self, totals: dict):
+        """Return {(name, unit): quantity to buy} of the totals of a shopping list, see aggregation.subtract_stock"""
+        return subtract_stock(totals, self.get_stock())
+
+    # UPDATE
+    def set_items(self, items: Iterable, replace: bool = False):
+        """Set the quantity in stock of several ingredients in one transaction, see api.Pantry.set_items"""
+        updates = {}
+        for item in items:
+            key, quantity = normalize_stock_item(item, self.unit_registry)
+            updates[key] = updates.get(key, 0) + quantity
+        with self.connection:
+            if replace:
+                self.connection.execute("DELETE FROM pantry")
+            self.connection.executemany(
+                "INSERT INTO pantry (name, unit, quantity) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, unit) DO UPDATE SET quantity = excluded.quantity",
+                [(name, unit, quantity) for (name, unit), quantity in updates.items()])
+            self.connection.execute("DELETE FROM pantry WHERE quantity <= 0")
+        return self._count()
+
+    def adjust_items(self, items: Iterable):
+        """Add the quantities of several ingredients to the stock in one transaction, see api.Pantry.adjust_items"""
+        changes = [normalize_stock_item(item, self.unit_registry) for item in items]
+        with self.connection:
+            # Rounded to hide float errors, the NUMERIC column stores the integer results as integers
+            self.connection.executemany(
+                "INSERT INTO pantry (name, unit, quantity) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, unit) DO UPDATE SET quantity = ROUND(quantity + excluded.quantity, 9)",
+                [(name, unit, quantity) for (name, unit), quantity in changes])
+            self.connection.execute("DELETE FROM pantry WHERE quantity <= 0")
+        return self._count()
+
+    def import_pantry(self, path, replace: bool = True):
+        """Set the stock from a JSON or CSV file (see api.read_pantry_file) in one transaction, see set_items"""
+        return self.set_items(read_pantry_file(path), replace=replace)
+
+    # DELETE
+    def remove_items(self, names: Iterable[str]):
+        """Remove the ingredients from the stock in one transaction, in all units, return the number of removed items"""
+        names = {name if self.unit_registry is None else self.unit_registry.normalize_name(name) for name in names}
+        with self.connection:
+            cursor = self.connection.executemany("DELETE FROM pantry WHERE name = ?", [(name,) for name in names])
+        return cursor.rowcount
+
+    def clear(self):
+        """Remove all the ingredients from the stock"""
+        with self.connection:
+            self.connection.execute("DELETE FROM pantry")
+
+
+class SQLiteShoppingList:
+    """Class used to generate shopping list, stored in SQLite"""
+    def __init__(self, db_path, unit_registry=DEFAULT_REGISTRY):
+        """unit_registry : units.UnitRegistry used to merge the same ingredients in compatible units, None to disable"""
+        self.unit_registry = unit_registry
+        self.connection = connect(db_path)
+        self.recipes_manager = SQLiteRecipesManager(self.connection)
+        self.pantry = SQLitePantry(self.connection, unit_registry=unit_registry)
+
+    def _add_recipe(self, recipe, quantity):
+        with self.connection:
+            self.connection.execute("INSERT INTO recipes_list (recipe_id, quantity) VALUES (?, ?)",
+                                    (int(recipe["id"]), quantity))
+
+    def _get_refs(self, where: str, parameters):
+        rows = self.connection.execute(f"SELECT id, recipe_id, quantity FROM recipes_list WHERE {where}", parameters)
+        return [{"recipe_id": str(recipe_id), "quantity": quantity, "id": str(id)}
+                for id, recipe_id, quantity in rows]
+
+    # PUBLICS METHODS CRUD FOR TABLE recipes_list
+
+    # CREATE
+    def add_recipe_by_title(self, title: str, quantity: int = 1):
+        """Add recipe to the table recipes_list by title"""
+        recipe = self.recipes_manager.get_recipe_by_title(title)
+        if recipe:
+            self._add_recipe(recipe=recipe, quantity=quantity)
+            return True
+        return False
+
+    def add_recipe_by_id(self, id, quantity):
+        """Add recipe to the table recipes_list by id"""
+        recipe = self.recipes_manager.get_recipe_by_id(id)
+        if recipe:
+            self._add_recipe(recipe=recipe, quantity=quantity)
+            return True
+        return False
+
+    # READ
+    def get_recipes_by_title(self, title):
+        """Get recipes to the table recipes_list by title"""
+        return self._get_refs("recipe_id = (SELECT id FROM recipes WHERE title = ?)", (title,))
+
+    def get_recipes_by_id(self, id):
+        return self._get_refs("id = ?", (int(id),))
+
+    def get_all_recipes(self):
+        """Get the entries of the table recipes_list with their recipe ({"id", "quantity", "recipe"})"""
+        recipes_refs = self._get_refs("1 ORDER BY id", ())
+        recipes = self.recipes_manager.get_recipes_by_ids(recipe_ref["recipe_id"] for recipe_ref in recipes_refs)
+        return [{"id": recipe_ref["id"], "quantity": recipe_ref["quantity"], "recipe": recipes[recipe_ref["recipe_id"]]}
+                for recipe_ref in recipes_refs if recipe_ref["recipe_id"] in recipes]
+
+    # UPDATE
+    def update_recipe_by_title(self, title, quantity):
+        """Update the recipes of the table recipes_list by title"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE recipes_list SET quantity = ? WHERE recipe_id = (SELECT id FROM recipes WHERE title = ?)",
+                (quantity, title))
+        return cursor.rowcount > 0
+
+    def update_recipe_by_id(self, id, quantity):
+        """Update a recipe from the table recipes_list by id"""
+        with self.connection:
+            self.connection.execute("UPDATE recipes_list SET quantity = ? WHERE id = ?", (quantity, int(id)))
+
+    # DELETE
+    def delete_recipe_by_title(self, title: str):
+        """Delete the recipes of the table recipes_list by title"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM recipes_list WHERE recipe_id = (SELECT id FROM recipes WHERE title = ?)", (title,))
+        return cursor.rowcount > 0
+
+    def delete_recipe_by_id(self, id):
+        """Delete a recipe from the table recipes_list by id"""
+        with self.connection:
+            self.connection.execute("DELETE FROM recipes_list WHERE id = ?", (int(id),))
+
+    def clear(self):
+        """Delete all the recipes of the table recipes_list"""
+        with self.connection:
+            self.connection.execute("DELETE FROM recipes_list")
+
+    def _get_totals(self):
+        """Return [(name, unit, total quantity)] of the list"""
+        # CROSS JOIN makes SQLite loop on the list and use the ingredients primary key,
+        # instead of scanning all the ingredients in (name, unit) order
+        rows = self.connection.execute(
+            "SELECT ingredients.name, ingredients.unit, SUM(ingredients.quantity * recipes_list.quantity) "
+            "FROM recipes_list CROSS JOIN ingredients ON ingredients.recipe_id = recipes_list.recipe_id "
+            "GROUP BY ingredients.name, ingredients.unit "
+            "ORDER BY ingredients.name, ingredients.unit").fetchall()
+        if self.unit_registry is not None:
+            # Merge the (name, unit) groups of SQL that are the same ingredient in compatible units
+            totals = {}
+            for name, unit, value in rows:
+                name, value, unit = self.unit_registry.normalize(name, value, unit)
+                totals[(name, unit)] = totals.get((name, unit), 0) + value
+            rows = [(name, unit, value) for (name, unit), value in totals.items()]
+        return rows
+
+    def _get_net_totals(self, subtract_pantry: bool = False):
+        """Return [(name, unit, quantity)] of the list, minus the stock of the pantry if subtract_pantry"""
+        totals = self._get_totals()
+        if subtract_pantry:
+            net = self.pantry.subtract({(name, unit): value for name, unit, value in totals})
+            totals = [(name, unit, value) for (name, unit), value in net.items()]
+        return totals
+
+    def generate(self, file=None, subtract_pantry: bool = False):
+        """Generate a list of ingredients with quantities
+
+        subtract_pantry : list only the quantities to buy, the stock of the pantry is subtracted from the totals
+        """
+        totals = self._get_net_totals(subtract_pantry=subtract_pantry)
+        list_ = [(name, f"{value} {unit}") for name, unit, value in totals]
+        with self.connection:
+            self.connection.execute("DELETE FROM shopping_list")
+            self.connection.executemany("INSERT INTO shopping_list (name, quantity) VALUES (?, ?)", list_)
+
+        if file:
+            export(iter_rows(totals), file)
+        return list_
+
+    def iter_rows(self, sort_by: str = None, group_by: str = None, subtract_pantry: bool = False):
+        """Yield the rows (export.Row) of the shopping list, see export.iter_rows for the options"""
+        return iter_rows(self._get_net_totals(subtract_pantry=subtract_pantry), sort_by=sort_by, group_by=group_by)
+
+    def export(self, file, format: str = "text", sort_by: str = None, group_by: str = None,
+               subtract_pantry: bool = False):
+        """Write the shopping list in file (a path or a file-like object), see export.WRITERS for the formats"""
+        export(self.iter_rows(sort_by=sort_by, group_by=group_by, subtract_pantry=subtract_pantry), file,
+               format=format)
+
+    def flush(self):
+        """Nothing to do, every change is committed"""
+
+    def flush_if_due(self):
+        """Nothing to do, every change is committed"""
+
+    def close_db(self):
+        self.connection.close()
+
+    def print_recipes(self):
+        """Return a string with recipes for print"""
+        text = ""
+        rows = self.connection.execute("SELECT recipes_list.id, recipes.title FROM recipes_list "
+                                       "JOIN recipes ON recipes.id = recipes_list.recipe_id ORDER BY recipes_list.id")
+        for id, title in rows:
+            text += f"{id} => {title}\n"
+        return text
+
+
+def migrate_from_tinydb(tinydb_path, sqlite_path, storage_format: str = "json"):
+    """Copy the recipes and the recipes_list of a TinyDB database in a SQLite database, ids are kept"""
+    db = open_db(tinydb_path, storage_format=storage_format)
+    connection = connect(sqlite_path)
+    recipes_manager = SQLiteRecipesManager(connection)
+    try:
+        recipes_ids = set()
+        with connection:
+            for recipe in db.table("recipes"):
+                title, ingredients = validate_recipe(recipe)
+                recipes_ids.add(recipes_manager._insert(recipes_manager._next_free_title(title), ingredients,
+                                                        id=int(recipe.get("id", recipe.doc_id))))
+            # References to deleted recipes are dropped
+            connection.executemany(
+                "INSERT INTO recipes_list (id, recipe_id, quantity) VALUES (?, ?, ?)",
+                [(int(ref.get("id", ref.doc_id)), int(ref["recipe_id"]), ref["quantity"])
+                 for ref in db.table("recipes_list") if int(ref["recipe_id"]) in recipes_ids])
+    finally:
+        db.close()
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Copy a PyShopping TinyDB database in a SQLite database")
+    parser.add_argument("tinydb_path")
+    parser.add_argument("sqlite_path")
+    parser.add_argument("--format", dest="storage_format", default="json")
+    args = parser.parse_args()
+
+    migrate_from_tinydb(args.tinydb_path, args.sqlite_path, storage_format=args.storage_format)
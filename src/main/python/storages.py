@@ -0,0 +1,303 @@
+"""
+Custom TinyDB storages and on-disk formats
+
+Migrate an existing database in place :
+python storages.py test.json --from json --to compact
+"""
+import argparse
+import atexit
+import json
+import logging
+import marshal
+import os
+import time
+
+from tinydb import TinyDB
+from tinydb.storages import Storage, touch
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LOGGER = logging.getLogger(__name__)
+
+# Durability levels of atomic writes
+DURABILITY_NONE = "none"    # No fsync, the OS decide when data reach the disk
+DURABILITY_FSYNC = "fsync"  # fsync the file before renaming it
+DURABILITY_FULL = "full"    # fsync the file and the directory after the rename
+DURABILITIES = (DURABILITY_NONE, DURABILITY_FSYNC, DURABILITY_FULL)
+
+
+class StorageFormat:
+    """Serialization of the whole database to bytes"""
+    name = None
+
+    def dumps(self, data) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, content: bytes):
+        raise NotImplementedError
+
+
+class JSONFormat(StorageFormat):
+    """JSON, indented by default like the TinyDB files written so far"""
+
+    def __init__(self, name="json", indent=4):
+        self.name = name
+        self.indent = indent
+
+    def dumps(self, data):
+        if self.indent is None:
+            return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return json.dumps(data, indent=self.indent).encode("utf-8")
+
+    def loads(self, content):
+        return json.loads(content.decode("utf-8"))
+
+
+class MarshalFormat(StorageFormat):
+    """Python marshal format, fastest to load but only readable by the same Python version"""
+    name = "marshal"
+
+    def dumps(self, data):
+        return marshal.dumps(data)
+
+    def loads(self, content):
+        return marshal.loads(content)
+
+
+class MsgpackFormat(StorageFormat):
+    """MessagePack format, needs the optional msgpack package"""
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("The msgpack format needs the msgpack package (pip install msgpack)")
+
+    def dumps(self, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, content):
+        return msgpack.unpackb(content, raw=False, strict_map_key=False)
+
+
+FORMATS = {
+    "json": lambda: JSONFormat(),
+    "compact": lambda: JSONFormat(name="compact", indent=None),
+    "marshal": MarshalFormat,
+    "msgpack": MsgpackFormat,
+}
+
+
+def get_format(storage_format: str) -> StorageFormat:
+    """Return the StorageFormat named storage_format"""
+    try:
+        return FORMATS[storage_format]()
+    except KeyError:
+        raise ValueError(f"storage_format must be one of {list(FORMATS)}, got {storage_format!r}")
+
+
+def open_db(db_path, storage_format: str = "json", write_behind: bool = False, **storage_options):
+    """Open a TinyDB database stored in db_path with the given format
+
+    write_behind : keep the database in memory and write it in batches (see WriteBehindStorage),
+    storage_options are passed to the storage
+    """
+    storage = WriteBehindStorage if write_behind else FormatStorage
+    return TinyDB(db_path, storage=storage, storage_format=storage_format, **storage_options)
+
+
+def migrate(path, from_format: str = "json", to_format: str = "compact"):
+    """Convert the database file in path from a format to another, in place"""
+    with open(path, "rb") as f:
+        content = f.read()
+    data = get_format(from_format).loads(content) if content else {}
+    write_atomic(path, get_format(to_format).dumps(data), durability=DURABILITY_FSYNC)
+    return len(content), os.path.getsize(path)
+
+
+def write_atomic(path, content: bytes, durability: str):
+    """Write content in a temporary file and rename it over path"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+        f.flush()
+        if durability != DURABILITY_NONE:
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    if durability == DURABILITY_FULL and hasattr(os, "O_DIRECTORY"):
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+class FormatStorage(Storage):
+    """Storage like the TinyDB JSONStorage, written in one of the FORMATS
+
+    The parsed data is kept in memory with the (mtime, size) of the file, it is parsed again only when the file has
+    been changed by another process.
+    """
+
+    def __init__(self, path, storage_format: str = "json", create_dirs=False):
+        super().__init__()
+
+        self.format = get_format(storage_format)
+        touch(path, create_dirs=create_dirs)
+        self._handle = open(path, mode="r+b")
+        # Used to know if the file has been changed by this process or by another one
+        self.write_count = 0
+        # Data last read or written, and the (mtime, size) of the file then
+        self._data = None
+        self._signature = None
+
+    def close(self):
+        self._handle.close()
+
+    def _stat_file(self):
+        stat = os.fstat(self._handle.fileno())
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self):
+        signature = self._stat_file()
+        if self._data is not None and signature == self._signature:
+            return self._data
+        if not signature[1]:
+            # Empty file, TinyDB will initialize the database
+            return None
+        self._handle.seek(0)
+        self._data = self.format.loads(self._handle.read())
+        self._signature = signature
+        return self._data
+
+    def write(self, data):
+        # TinyDB changes the data returned by read before writing it, it is only kept if the write succeeds
+        self._data = None
+        self._handle.seek(0)
+        self._handle.write(self.format.dumps(data))
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        # Remove data behind the cursor in case the file has gotten shorter
+        self._handle.truncate()
+        self._data = data
+        self._signature = self._stat_file()
+        self.write_count += 1
+
+
+class WriteBehindStorage(Storage):
+    """Storage that keep the database in memory and write it to the disk in batches
+
+    The database is written when flush_every writes are pending, when the oldest pending write is older than
+    flush_interval seconds (checked on each write and by flush_if_due), on close and at process exit.
+    The file is replaced by an atomic rename, so it always contains a complete state of the database.
+    The (mtime, size) of the file is checked on each read : if another process changed it and no write is pending,
+    the database is read again, if writes are pending the flush overwrites it and logs a warning.
+    """
+
+    def __init__(self, path, storage_format: str = "json", flush_every: int = 100, flush_interval: float = 1.0,
+                 durability: str = DURABILITY_FSYNC, create_dirs=False):
+        super().__init__()
+
+        if durability not in DURABILITIES:
+            raise ValueError(f"durability must be one of {DURABILITIES}, got {durability!r}")
+
+        self.path = os.fspath(path)
+        self.format = get_format(storage_format)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.durability = durability
+
+        if create_dirs:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._data = None
+        self._loaded = False
+        self._pending_writes = 0
+        self._first_pending_time = None
+        # (mtime, size) of the file when it was last read or written, None if it doesn't exist
+        self.file_signature = None
+        # Number of writes of the file
+        self.write_count = 0
+
+        atexit.register(self.flush)
+
+    def read(self):
+        if self._loaded and not self._pending_writes and self._stat_file() != self.file_signature:
+            # Changed by another process, there is no pending change to lose
+            self._loaded = False
+        if not self._loaded:
+            self._data = self._read_file()
+            self._loaded = True
+        return self._data
+
+    def write(self, data):
+        self._data = data
+        self._loaded = True
+        if not self._pending_writes:
+            self._first_pending_time = time.monotonic()
+        self._pending_writes += 1
+
+        if self._pending_writes >= self.flush_every:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush if the oldest pending write is older than flush_interval"""
+        if self._pending_writes and time.monotonic() - self._first_pending_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write pending data to the disk"""
+        if not self._pending_writes:
+            return
+        if self._stat_file() != self.file_signature:
+            LOGGER.warning("%s has been changed by another process, its changes are overwritten", self.path)
+        self._write_file(self._data)
+        self._pending_writes = 0
+        self._first_pending_time = None
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    # FILES
+
+    def _stat_file(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self):
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                content = f.read()
+        except FileNotFoundError:
+            self.file_signature = None
+            return None
+        self.file_signature = stat.st_mtime_ns, stat.st_size
+        if not content:
+            # Empty file, TinyDB will initialize the database
+            return None
+        return self.format.loads(content)
+
+    def _write_file(self, data):
+        write_atomic(self.path, self.format.dumps(data), durability=self.durability)
+        self.file_signature = self._stat_file()
+        self.write_count += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert a PyShopping database to another format, in place")
+    parser.add_argument("path")
+    parser.add_argument("--from", dest="from_format", default="json", choices=list(FORMATS))
+    parser.add_argument("--to", dest="to_format", default="compact", choices=list(FORMATS))
+    args = parser.parse_args()
+
+    old_size, new_size = migrate(args.path, from_format=args.from_format, to_format=args.to_format)
+    print(f"{args.path} : {args.from_format} ({old_size} octets) -> {args.to_format} ({new_size} octets)")
@@ -0,0 +1,91 @@
+"""
+Normalization of ingredients names and units, so that "g", "gr" and "kg" of the same ingredient are added together
+"""
+import sys
+
+
+def normalize_text(text: str):
+    """Case-fold a text and collapse its whitespaces"""
+    return " ".join(str(text).casefold().split())
+
+
+def to_int_if_integer(quantity):
+    if isinstance(quantity, float) and quantity.is_integer():
+        return int(quantity)
+    return quantity
+
+
+class UnitRegistry:
+    """Canonical units with their aliases and conversion factors
+
+    Lookups are done in precompiled alias tables and cached by raw string, so normalizing an ingredient is O(1)
+    """
+
+    def __init__(self):
+        # normalized alias -> (canonical unit, factor to the canonical unit)
+        self._aliases = {}
+        # raw unit -> (canonical unit, factor), raw name -> normalized name
+        self._unit_cache = {}
+        self._name_cache = {}
+
+    def define(self, canonical: str, aliases=(), factor=1, base: str = None):
+        """Define a unit and its aliases, factor is the number of base units in one canonical unit
+
+        If base is given, quantities are converted to base (e.g. define("kg", factor=1000, base="g"))
+        """
+        if base is None:
+            target, base_factor = sys.intern(canonical), 1
+        else:
+            target, base_factor = self._aliases[normalize_text(base)]
+        for alias in (canonical, *aliases):
+            self._aliases[normalize_text(alias)] = (target, factor * base_factor)
+        self._unit_cache.clear()
+
+    def normalize_unit(self, unit: str):
+        """Return (canonical unit, factor), unknown units are only case-folded"""
+        try:
+            return self._unit_cache[unit]
+        except KeyError:
+            key = normalize_text(unit)
+            result = self._aliases.get(key, (sys.intern(key), 1))
+            self._unit_cache[unit] = result
+            return result
+
+    def normalize_name(self, name: str):
+        """Return the case-folded and interned name"""
+        try:
+            return self._name_cache[name]
+        except KeyError:
+            result = sys.intern(normalize_text(name))
+            self._name_cache[name] = result
+            return result
+
+    def normalize(self, name: str, quantity, unit: str):
+        """Return (name, quantity, unit) with the name normalized and the quantity in the canonical unit"""
+        canonical, factor = self.normalize_unit(unit)
+        if factor != 1:
+            # Rounded to hide float errors of the conversion (0.3 kg -> 300 g and not 300.00000000000006 g)
+            quantity = to_int_if_integer(round(quantity * factor, 9))
+        return self.normalize_name(name), quantity, canonical
+
+
+def default_registry():
+    """Return a registry with the usual units of French recipes"""
+    registry = UnitRegistry()
+    # Mass, in grams
+    registry.define("g", aliases=("gr", "gramme", "grammes", "gram", "grams"))
+    registry.define("kg", aliases=("kilo", "kilos", "kilogramme", "kilogrammes"), factor=1000, base="g")
+    registry.define("mg", aliases=("milligramme", "milligrammes"), factor=0.001, base="g")
+    # Volume, in milliliters
+    registry.define("ml", aliases=("millilitre", "millilitres"))
+    registry.define("cl", aliases=("centilitre", "centilitres"), factor=10, base="ml")
+    registry.define("dl", aliases=("décilitre", "décilitres"), factor=100, base="ml")
+    registry.define("l", aliases=("litre", "litres", "liter", "liters"), factor=1000, base="ml")
+    registry.define("c. à s.", aliases=("càs", "cas", "cuillère à soupe", "cuillères à soupe"), factor=15, base="ml")
+    registry.define("c. à c.", aliases=("càc", "cac", "cuillère à café", "cuillères à café"), factor=5, base="ml")
+    # Count
+    registry.define("pièce", aliases=("pièces", "piece", "pieces", "pc", "pcs", "unité", "unités", "u"))
+    return registry
+
+
+DEFAULT_REGISTRY = default_registry()
@@ -0,0 +1,26 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The modules of the application import each other from src/main/python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "main", "python"))
+
+
+@pytest.fixture
+def console_db(tmp_path):
+    """Path of a db.json written like ConsoleApp does it, quantities saved as the text typed"""
+    path = tmp_path / "console.json"
+    path.write_text(json.dumps({
+        "recipes": {
+            "1": {"title": "pâtes", "id": "1",
+                  "ingredients": [{"name": "pâtes", "quantity": "200", "unit": "g"},
+                                  {"name": "beurre", "quantity": "12.25", "unit": "g"}]},
+        },
+        "recipes_list": {
+            "1": {"recipe_id": "1", "quantity": 2, "id": "1"},
+        },
+    }), encoding="utf-8")
+    return path
@@ -0,0 +1,22 @@
+from aggregation import Aggregator, aggregate_many
+from api import IngredientBatch
+
+
+def make_aggregator():
+    aggregator = Aggregator(use_numpy=False)
+    for i in range(1, 21):
+        aggregator.encode(str(i), IngredientBatch(["farine", f"épice {i % 3}", "lait"], [i, 2, 0.5],
+                                                  ["g", "g", "l"]))
+    return aggregator
+
+
+def test_aggregate_many_in_a_pool_gives_the_totals_of_one_process():
+    aggregator = make_aggregator()
+    refs_lists = [[{"recipe_id": str((i * j) % 20 + 1), "quantity": j % 4 + 1} for j in range(i + 1)]
+                  for i in range(7)]
+
+    in_process = aggregate_many(aggregator, refs_lists, workers=1)
+    in_pool = aggregate_many(aggregator, refs_lists, workers=2, min_refs_by_worker=1)
+
+    assert in_pool == in_process
+    assert in_process == [aggregator.aggregate_with_counts(recipes_refs) for recipes_refs in refs_lists]
@@ -0,0 +1,62 @@
+import pytest
+
+from api import Ingredient, RecipesManager, ShoppingList, validate_recipe
+
+
+def test_deleted_recipe_id_is_not_given_again(tmp_path):
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    recipes_manager = shopping_list.recipes_manager
+    recipes_manager.add_recipe("a", [Ingredient("farine", 1, "g")])
+    recipes_manager.add_recipe("b", [Ingredient("poison", 3, "g")])
+    shopping_list.add_recipe_by_title("b", 1)
+
+    recipes_manager.delete_recipe_by_id(2)
+    recipes_manager.add_recipe("c", [Ingredient("sucre", 2, "g")])
+
+    assert recipes_manager.get_recipe_by_title("c")["id"] == "3"
+    assert recipes_manager.get_recipe_by_id("2") is None
+    assert shopping_list.generate(rebuild=True) == []
+    shopping_list.close_db()
+
+
+def test_delete_recipe_deletes_its_entries(tmp_path):
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    recipes_manager = shopping_list.recipes_manager
+    recipes_manager.add_recipe("a", [Ingredient("farine", 1, "g")])
+    recipes_manager.add_recipe("b", [Ingredient("poison", 3, "g")])
+    shopping_list.add_recipe_by_title("a", 1)
+    shopping_list.add_recipe_by_title("b", 1)
+    recipes_manager.delete_recipe_by_title("b")
+    shopping_list.close_db()
+
+    # Reopened, TinyDB gives the id of the last recipe again
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    shopping_list.recipes_manager.add_recipe("c", [Ingredient("sucre", 2, "g")])
+    assert [entry["recipe_id"] for entry in shopping_list.recipes_list.all()] == ["1"]
+    assert shopping_list.generate(rebuild=True) == [("farine", "1 g")]
+    shopping_list.close_db()
+
+
+def test_deleted_entry_id_is_not_given_again(tmp_path):
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    shopping_list.recipes_manager.add_recipe("a", [Ingredient("farine", 1, "g")])
+    shopping_list.add_recipe_by_title("a", 1)
+    shopping_list.add_recipe_by_title("a", 2)
+
+    shopping_list.delete_recipe_by_id(2)
+    shopping_list.add_recipe_by_title("a", 3)
+
+    assert sorted(entry["id"] for entry in shopping_list.get_all_recipes()) == ["1", "3"]
+    shopping_list.close_db()
+
+
+def test_import_console_database_converts_text_quantities(console_db, tmp_path):
+    recipes_manager = RecipesManager(tmp_path / "db.json")
+    assert recipes_manager.import_recipes(console_db).count == 1
+    ingredients = recipes_manager.get_recipe_by_title("pâtes")["ingredients"]
+    assert [(ingredient.name, ingredient.quantity) for ingredient in ingredients] == [("pâtes", 200), ("beurre", 12.25)]
+
+
+def test_validate_recipe_rejects_text_which_is_not_a_number():
+    with pytest.raises(ValueError):
+        validate_recipe({"title": "pâtes", "ingredients": [{"name": "pâtes", "quantity": "beaucoup", "unit": "g"}]})
@@ -0,0 +1,76 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from api import Ingredient, RecipesManager
+from async_api import AsyncShoppingList
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_write_of_a_batch_whose_flush_failed_is_applied(tmp_path):
+    path = tmp_path / "db.json"
+    recipes_manager = RecipesManager(path)
+    recipes_manager.add_recipe("pâtes", [Ingredient("pâtes", 200, "g")])
+    recipes_manager.db.close()
+
+    async def scenario():
+        shopping_list = await AsyncShoppingList.open(path)
+        storage = shopping_list._backend.database.db.storage
+        write_file = storage._write_file
+
+        def fail(data):
+            raise OSError("disque plein")
+
+        storage._write_file = fail
+        assert await shopping_list.add_recipe_by_title("pâtes", 2)
+        assert isinstance(shopping_list._backend.flush_error, OSError)
+        with pytest.raises(OSError):
+            await shopping_list.flush()
+
+        storage._write_file = write_file
+        await shopping_list.flush()
+        assert shopping_list._backend.flush_error is None
+        await shopping_list.close_db()
+
+    run(scenario())
+    entries = json.loads(path.read_text(encoding="utf-8"))["recipes_list"]
+    assert [entry["quantity"] for entry in entries.values()] == [2]
+
+
+def test_read_completes_while_a_batch_is_written(tmp_path):
+    path = tmp_path / "db.json"
+    recipes_manager = RecipesManager(path)
+    recipes_manager.add_recipe("pâtes", [Ingredient("pâtes", 200, "g")])
+    recipes_manager.db.close()
+
+    async def scenario():
+        shopping_list = await AsyncShoppingList.open(path)
+        storage = shopping_list._backend.database.db.storage
+        write_file = storage._write_file
+        release = threading.Event()
+
+        def slow_write_file(data):
+            release.wait(5)
+            write_file(data)
+
+        storage._write_file = slow_write_file
+        write = asyncio.ensure_future(shopping_list.add_recipe_by_title("pâtes", 2))
+        await asyncio.sleep(0.1)
+        entries = await asyncio.wait_for(shopping_list.get_all_recipes(), 1)
+        assert not write.done()
+        assert [entry["quantity"] for entry in entries] == [2]
+
+        release.set()
+        assert await write
+        await shopping_list.close_db()
+
+    run(scenario())
@@ -0,0 +1,11 @@
+from catalog import CatalogRecipesManager, build_catalog_from_tinydb
+
+
+def test_build_catalog_from_console_database(console_db, tmp_path):
+    catalog_path = tmp_path / "recipes.catalog"
+    assert build_catalog_from_tinydb(console_db, catalog_path) == 1
+
+    catalog = CatalogRecipesManager(catalog_path)
+    ingredients = catalog.get_recipe_by_id("1")["ingredients"]
+    assert [ingredient.quantity for ingredient in ingredients] == [200, 12.25]
+    catalog.close()
@@ -0,0 +1,36 @@
+import io
+
+from api import Ingredient, RecipesManager
+from cli import main
+
+
+def run(*argv):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status = main(list(argv), stdout=stdout, stderr=stderr)
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+def test_unknown_list_is_an_error_until_it_is_created(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    recipes_manager = RecipesManager(db_path)
+    recipes_manager.add_recipe("pâtes", [Ingredient("pâtes", 200, "g")])
+    recipes_manager.db.close()
+
+    status, _, stderr = run(db_path, "--list", "semaine", "list", "add", "pâtes")
+    assert status == 1
+    assert "Liste inconnue : semaine" in stderr
+
+    assert run(db_path, "--list", "semaine", "list", "create")[0] == 0
+    assert run(db_path, "--list", "semaine", "list", "add", "pâtes", "2")[0] == 0
+    assert run(db_path, "--list", "semaine", "list", "generate") == (0, "pâtes => 400 g\n", "")
+
+
+def test_bad_options_are_reported_without_traceback(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    status, _, stderr = run(db_path, "--list", "", "list", "show")
+    assert status == 1
+    assert stderr.startswith("Erreur : ")
+
+    status, _, stderr = run(db_path, "--storage-format", "yaml", "list", "show")
+    assert status == 2
+    assert "invalid choice" in stderr
@@ -0,0 +1,20 @@
+from api import Ingredient, ShoppingList
+
+
+def test_generate_subtracts_the_pantry(tmp_path):
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    shopping_list.recipes_manager.add_recipe("crêpes", [Ingredient("farine", 250, "g"), Ingredient("lait", 0.5, "l"),
+                                                        Ingredient("œufs", 4, "pièce")])
+    shopping_list.add_recipe_by_title("crêpes", 2)
+    shopping_list.pantry.set_items([
+        # Partial stock, in another unit of the same dimension
+        {"name": "farine", "quantity": 0.2, "unit": "kg"},
+        # More than needed
+        Ingredient("lait", 2, "l"),
+        # Not comparable with the pièces of the recipe
+        Ingredient("œufs", 300, "g"),
+    ])
+
+    assert shopping_list.generate(subtract_pantry=True) == [("farine", "300 g"), ("œufs", "8 pièce")]
+    assert shopping_list.generate() == [("farine", "500 g"), ("lait", "1000 ml"), ("œufs", "8 pièce")]
+    shopping_list.close_db()
@@ -0,0 +1,39 @@
+from api import Ingredient, ShoppingList
+
+
+def assert_totals_are_right(shopping_list):
+    """The running totals equal the totals aggregated again from the recipes_list table"""
+    # Synchronizes the aggregator with the version of the recipes first
+    running_totals = shopping_list._get_totals()
+    totals, _ = shopping_list._aggregate(shopping_list.recipes_list.all())
+    assert running_totals.matches(totals)
+    assert running_totals.totals == totals
+
+
+def test_running_totals_equal_a_full_aggregation(tmp_path):
+    shopping_list = ShoppingList(tmp_path / "db.json")
+    recipes_manager = shopping_list.recipes_manager
+    recipes_manager.add_recipe("crêpes", [Ingredient("farine", 250, "g"), Ingredient("lait", 0.5, "l"),
+                                          Ingredient("œufs", 4, "pièce")])
+    recipes_manager.add_recipe("gâteau", [Ingredient("farine", 200, "g"), Ingredient("sucre", 100, "g"),
+                                          Ingredient("lait", 10, "cl")])
+    shopping_list.add_recipe_by_title("crêpes", 1)
+    # Built here, then updated by each change
+    shopping_list.generate()
+    running_totals = shopping_list._totals
+
+    shopping_list.add_recipe_by_title("gâteau", 2)
+    assert_totals_are_right(shopping_list)
+
+    shopping_list.update_recipe_by_title("crêpes", 3)
+    assert_totals_are_right(shopping_list)
+
+    shopping_list.delete_recipe_by_title("gâteau")
+    assert_totals_are_right(shopping_list)
+    assert ("sucre", "g") not in shopping_list._get_totals().totals
+    assert shopping_list._totals is running_totals
+
+    recipes_manager.update_recipe_by_title("crêpes", [Ingredient("farine", 300, "g"), Ingredient("beurre", 50, "g")])
+    assert_totals_are_right(shopping_list)
+    assert shopping_list.generate() == [("farine", "900 g"), ("beurre", "150 g")]
+    shopping_list.close_db()
@@ -0,0 +1,38 @@
+from search import SearchIndex
+
+
+def make_index(count: int):
+    index = SearchIndex()
+    for i in range(1, count + 1):
+        index.add(str(i), f"{'tarte' if i % 10 == 0 else 'soupe'} {i} {i * 7 % 1000}", [f"ingredient_{i % 97}", "sel"])
+    return index
+
+
+def scores(index: SearchIndex, query: str, ids):
+    """Return the scores of ids for query, computed from all the levels of each searched word"""
+    totals = dict.fromkeys(ids, 0)
+    for word in query.split():
+        for id in ids:
+            totals[id] += next(score for score, level_ids in index._levels(word) if id in level_ids)
+    return [totals[id] for id in ids]
+
+
+def test_search_with_limit_returns_the_best_recipes():
+    index = make_index(3000)
+    for query in ("tarte 12", "12 34", "soupe sel 77"):
+        found = index.search(query)
+        for limit in (1, 5, 20):
+            best = index.search(query, limit=limit)
+            assert len(best) == min(limit, len(found))
+            assert set(best) <= set(found)
+            assert scores(index, query, best) == sorted(scores(index, query, found), reverse=True)[:len(best)]
+
+
+def test_search_of_many_sparse_words_returns_the_best_recipes():
+    # Each number matches hundreds of words, all their combinations would not fit in memory
+    index = make_index(20000)
+    for query in ("12 34", "12 34 56"):
+        found = index.search(query)
+        best = index.search(query, limit=10)
+        assert found and len(best) == min(10, len(found))
+        assert scores(index, query, best) == sorted(scores(index, query, found), reverse=True)[:len(best)]
@@ -0,0 +1,42 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from server import close_server, make_server
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    server = make_server(tmp_path / "db.json", port=0, threads=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield host, port
+    server.shutdown()
+    thread.join()
+    close_server(server)
+
+
+def request(server_url, method: str, path: str, body=None):
+    connection = http.client.HTTPConnection(*server_url, timeout=10)
+    connection.request(method, path, body=None if body is None else json.dumps(body))
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, data
+
+
+def test_export_with_unknown_sort_or_group_is_a_bad_request(server_url):
+    recipe = {"title": "pâtes", "ingredients": [{"name": "pâtes", "quantity": 200, "unit": "g"}]}
+    assert request(server_url, "POST", "/recipes", recipe)[0] == 201
+    assert request(server_url, "POST", "/lists", {"name": "semaine"})[0] == 201
+    assert request(server_url, "POST", "/lists/semaine/recipes", {"title": "pâtes", "quantity": 2})[0] == 201
+
+    status, data = request(server_url, "GET", "/lists/semaine/export?format=csv&sort_by=name&group_by=unit")
+    assert status == 200 and "pâtes,400,g,g" in data.decode("utf-8")
+    for query in ("sort_by=bogus", "group_by=bogus"):
+        status, data = request(server_url, "GET", f"/lists/semaine/export?{query}")
+        assert status == 400
+        assert "bogus" in json.loads(data)["error"]
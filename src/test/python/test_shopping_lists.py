@@ -0,0 +1,60 @@
+import pytest
+
+from api import Ingredient, ShoppingLists
+
+
+@pytest.fixture
+def shopping_lists(tmp_path):
+    shopping_lists = ShoppingLists(tmp_path / "db.json")
+    shopping_lists.recipes_manager.add_recipe("pâtes", [Ingredient("pâtes", 200, "g")])
+    shopping_lists.recipes_manager.add_recipe("soupe", [Ingredient("poireaux", 2, "pièce")])
+    yield shopping_lists
+    shopping_lists.close_db()
+
+
+def test_create_lists_with_their_own_entries(shopping_lists):
+    shopping_lists.get("lundi").add_recipe_by_title("pâtes", 2)
+    shopping_lists.get("mardi").add_recipe_by_title("soupe", 1)
+
+    assert shopping_lists.names() == ["lundi", "mardi"]
+    assert shopping_lists.get("mercredi", create=False) is None
+    assert shopping_lists.generate("lundi") == [("pâtes", "400 g")]
+    assert shopping_lists.generate("mardi") == [("poireaux", "2 pièce")]
+    with pytest.raises(ValueError):
+        shopping_lists.get("")
+
+
+def test_rename_list(shopping_lists):
+    shopping_lists.get("lundi").add_recipe_by_title("pâtes", 2)
+    shopping_lists.get("mardi")
+
+    assert shopping_lists.rename("lundi", "semaine")
+    assert shopping_lists.names() == ["semaine", "mardi"]
+    assert shopping_lists.get("lundi", create=False) is None
+    assert [entry["id"] for entry in shopping_lists.get("semaine").get_all_recipes()] == ["1"]
+    assert shopping_lists.generate("semaine") == [("pâtes", "400 g")]
+    assert not shopping_lists.rename("lundi", "dimanche")
+    with pytest.raises(ValueError):
+        shopping_lists.rename("semaine", "mardi")
+
+
+def test_delete_list(shopping_lists):
+    shopping_lists.get("lundi").add_recipe_by_title("pâtes", 2)
+
+    assert shopping_lists.delete("lundi")
+    assert not shopping_lists.delete("lundi")
+    assert shopping_lists.names() == []
+    # A new list of the same name starts empty
+    assert shopping_lists.get("lundi").get_all_recipes() == []
+
+
+def test_lists_are_kept_when_the_database_is_reopened(tmp_path, shopping_lists):
+    shopping_lists.get("lundi").add_recipe_by_title("pâtes", 2)
+    shopping_lists.get("mardi").add_recipe_by_title("soupe", 3)
+    shopping_lists.rename("mardi", "jeudi")
+    shopping_lists.close_db()
+
+    reopened = ShoppingLists(tmp_path / "db.json")
+    assert reopened.names() == ["lundi", "jeudi"]
+    assert reopened.generate_all() == {"lundi": [("pâtes", "400 g")], "jeudi": [("poireaux", "6 pièce")]}
+    reopened.close_db()
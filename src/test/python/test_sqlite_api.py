@@ -0,0 +1,10 @@
+from sqlite_api import SQLiteShoppingList, migrate_from_tinydb
+
+
+def test_migrate_console_database(console_db, tmp_path):
+    sqlite_path = tmp_path / "db.sqlite"
+    migrate_from_tinydb(console_db, sqlite_path)
+
+    shopping_list = SQLiteShoppingList(sqlite_path)
+    assert sorted(shopping_list.generate()) == [("beurre", "24.5 g"), ("pâtes", "400 g")]
+    shopping_list.close_db()
@@ -0,0 +1,50 @@
+import logging
+
+from api import Ingredient, RecipesManager
+from storages import open_db
+
+
+def test_write_behind_reads_again_a_file_changed_by_another_process(tmp_path):
+    path = tmp_path / "db.json"
+    recipes_manager = RecipesManager(open_db(path, write_behind=True))
+    recipes_manager.add_recipe("a", [Ingredient("farine", 1, "g")])
+    recipes_manager.db.storage.flush()
+    assert recipes_manager.get_recipe_by_title("b") is None
+
+    other = RecipesManager(path)
+    other.add_recipe("b", [Ingredient("sucre", 2, "g")])
+    other.db.close()
+
+    assert recipes_manager.get_recipe_by_title("b")["id"] == "2"
+    recipes_manager.add_recipe("c", [Ingredient("sel", 3, "g")])
+    assert recipes_manager.get_recipe_by_title("c")["id"] == "3"
+    recipes_manager.db.close()
+
+
+def test_write_behind_flush_warns_when_the_file_was_changed(tmp_path, caplog):
+    path = tmp_path / "db.json"
+    db = open_db(path, write_behind=True)
+    db.table("recipes").insert({"title": "a"})
+    db.storage.flush()
+
+    db.table("recipes").insert({"title": "b"})
+    other = open_db(path)
+    other.table("recipes").insert({"title": "c"})
+    other.close()
+    with caplog.at_level(logging.WARNING, logger="storages"):
+        db.storage.flush()
+    assert "changed by another process" in caplog.text
+    db.close()
+
+
+def test_format_storage_parses_the_file_again_only_when_it_changed(tmp_path):
+    path = tmp_path / "db.json"
+    db = open_db(path)
+    db.table("recipes").insert({"title": "a"})
+    assert db.storage.read() is db.storage.read()
+
+    other = open_db(path)
+    other.table("recipes").insert({"title": "bb"})
+    other.close()
+    assert [recipe["title"] for recipe in db.table("recipes")] == ["a", "bb"]
+    db.close()